@@ -0,0 +1 @@
+# just to use api as module
\ No newline at end of file
@@ -0,0 +1,185 @@
+import json
+import time
+import threading
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from monitoring import metrics
+
+class SharedSnapshot:
+    def __init__(self, read_values, max_age:float=1.0):
+        """latest values of all data sources, built at most once per max_age and encoded once for all clients.
+        Concurrent requests wait for the one build in progress instead of building their own.
+        Args:
+            read_values (function): function without parameters returning all values (must not block on sensors or inverter)
+            max_age (float): seconds a built snapshot is served
+        """
+        self.read_values = read_values
+        self.max_age = max_age
+        self.build_lock = threading.Lock() # only one build at a time
+        self.changed = threading.Condition() # notifies event stream clients
+        self.values:dict[str:any] = None
+        self.body:bytes = b"{}" # encoded snapshot
+        self.version:int = 0 # increased when values change
+        self.built_at:float = None # monotonic time of last build
+        self.builds:int = 0
+
+    def get(self) -> tuple:
+        """returns current snapshot, rebuilds it if older than max_age
+        Returns:
+            tuple: (version, encoded JSON)
+        """
+        if self.built_at is None or time.monotonic() - self.built_at > self.max_age:
+            with self.build_lock:
+                if self.built_at is None or time.monotonic() - self.built_at > self.max_age: # not built by request waited for
+                    self.build()
+        return self.version, self.body
+
+    def build(self):
+        """reads values once and encodes them, clients of event stream are notified if values changed
+        """
+        with metrics.timer("api.build"):
+            values = self.read_values()
+            self.builds += 1
+            self.built_at = time.monotonic()
+            if values == self.values:
+                return
+            body = json.dumps({"time": time.time(), "version": self.version + 1, "values": values}).encode()
+            with self.changed:
+                self.values = values
+                self.body = body
+                self.version += 1
+                self.changed.notify_all()
+
+    def wait_for_change(self, version:int, timeout:float) -> tuple:
+        """blocks until snapshot is newer than version
+        Args:
+            version (int): version known by client
+            timeout (float): maximum seconds to wait
+
+        Returns:
+            tuple: (version, encoded JSON), same version if timed out
+        """
+        with self.changed:
+            self.changed.wait_for(lambda: self.version != version, timeout)
+            return self.version, self.body
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    server_version = "HomeDisplayPi"
+
+    def do_GET(self):
+        path = urllib.parse.urlparse(self.path).path.rstrip("/")
+        metrics.increment("api.requests")
+        if path == "/api/values":
+            self.send_json(self.server.snapshot.get()[1])
+        elif path.startswith("/api/values/"):
+            source = urllib.parse.unquote(path.removeprefix("/api/values/"))
+            self.server.snapshot.get()
+            values = self.server.snapshot.values or {}
+            if source not in values:
+                self.send_error(404, "unknown data source")
+                return
+            self.send_json(json.dumps(values[source]).encode())
+        elif path == "/api/stats":
+            self.send_json(json.dumps(self.server.get_stats(), default=str).encode())
+        elif path == "/api/events":
+            self.stream_events()
+        else:
+            self.send_error(404)
+
+    def send_json(self, body:bytes):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*") # dashboards from other hosts
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream_events(self):
+        """server-sent events: one "values" event per changed snapshot, comment lines keep the connection open
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        snapshot = self.server.snapshot
+        version, body = snapshot.get()
+        metrics.increment("api.event_clients")
+        try:
+            self.wfile.write(b"event: values\ndata: " + body + b"\n\n")
+            self.wfile.flush()
+            while not self.server.stopping:
+                new_version, body = snapshot.wait_for_change(version, self.server.keepalive_interval)
+                if new_version == version:
+                    self.wfile.write(b": keepalive\n\n")
+                else:
+                    version = new_version
+                    self.wfile.write(b"event: values\ndata: " + body + b"\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError): # client closed stream
+            pass
+        finally:
+            metrics.increment("api.event_clients", -1)
+
+    def log_message(self, format, *args):
+        pass # no line per request on stdout
+
+class ApiServer:
+    def __init__(self, read_values, get_stats, host:str="0.0.0.0", port:int=8080, refresh_interval:float=1.0, keepalive_interval:float=15):
+        """read-only HTTP/JSON API with server-sent events, every client is answered from one shared snapshot,
+        so the number of clients doesn't change the load of the inverter.
+        GET /api/values, /api/values/<source>, /api/stats and /api/events (text/event-stream)
+        Args:
+            read_values (function): function without parameters returning latest values of all sources (e.g. DisplayController.get_current_values)
+            get_stats (function): function without parameters returning statistics (e.g. DisplayController.get_stats)
+            host (str): address to listen on ("127.0.0.1" for this Raspberry Pi only)
+            port (int): port to listen on
+            refresh_interval (float): seconds between two snapshot builds
+            keepalive_interval (float): seconds without change until an event stream gets a keepalive comment
+        """
+        self.snapshot = SharedSnapshot(read_values, max_age=refresh_interval)
+        self.refresh_interval = refresh_interval
+        self.http_server = ThreadingHTTPServer((host, port), ApiRequestHandler)
+        self.http_server.daemon_threads = True # open event streams don't block stop
+        self.http_server.snapshot = self.snapshot
+        self.http_server.get_stats = get_stats
+        self.http_server.keepalive_interval = keepalive_interval
+        self.http_server.stopping = False
+        self.server_thread:threading.Thread = None
+        self.refresh_thread:threading.Thread = None
+        self.stop_event = threading.Event()
+
+    def refresh(self):
+        """rebuilds snapshot every refresh_interval, so event streams get changes without a request
+        """
+        while not self.stop_event.wait(self.refresh_interval):
+            try:
+                self.snapshot.get()
+            except Exception as e: # next build is tried after refresh_interval, clients keep the last snapshot
+                metrics.increment("errors.api." + type(e).__name__)
+                print("API refresh error:", type(e).__name__, e)
+
+    def start(self):
+        """starts serving requests in background (does nothing if already started)
+        """
+        if self.server_thread is not None:
+            return
+        self.server_thread = threading.Thread(target=self.http_server.serve_forever, name="api-server", daemon=True)
+        self.refresh_thread = threading.Thread(target=self.refresh, name="api-refresh", daemon=True)
+        self.server_thread.start()
+        self.refresh_thread.start()
+
+    def stop(self):
+        """stops serving requests and ends event streams
+        """
+        self.http_server.stopping = True
+        self.stop_event.set()
+        if self.server_thread is not None:
+            self.http_server.shutdown()
+            self.server_thread.join()
+            self.refresh_thread.join()
+        self.http_server.server_close()
+
+    def get_stats(self) -> dict[str:int]:
+        return {"snapshot_builds": self.snapshot.builds, "snapshot_version": self.snapshot.version}
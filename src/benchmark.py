@@ -0,0 +1,120 @@
+import time
+import argparse
+
+from display_controllers import display_controller
+from data_sources import temperature_and_humidity_data
+from emulation.virtual_max7219 import VirtualMax7219
+from emulation.fake_sensors import FakeW1Tree, ScriptedDHT
+from emulation.fake_inverter import FakeInverter
+from monitoring import metrics
+
+def get_percentile(values:list[float], percent:float) -> float:
+    """returns value below which percent of values lie
+    Args:
+        values (list[float]): measured values
+        percent (float): percentile - [0, 100]
+
+    Returns:
+        float: percentile, None if no values
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+def summarize(values:list[float], scale:float=1000) -> str:
+    """returns mean, p95 and max of values (in ms by default)
+    """
+    if not values:
+        return "no samples"
+    return "avg %.2f  p95 %.2f  max %.2f  (n=%d)" % (sum(values) / len(values) * scale, get_percentile(values, 95) * scale,
+                                                   max(values) * scale, len(values))
+
+def format_histogram(histogram:dict[str:float]) -> str:
+    """returns mean, p95 and max of a metrics histogram summary
+    """
+    if not histogram:
+        return "no samples"
+    return "avg %.2f  p95 %.2f  max %.2f  (n=%d)" % (histogram["avg_ms"], histogram["p95_ms"], histogram["max_ms"], histogram["count"])
+
+def get_scroll_jitter(frame_times:list[float], scroll_delay:float) -> list[float]:
+    """returns deviation of frame intervals from scroll_delay, intervals longer than 1.5 scroll delays are pauses between scrolls
+    Args:
+        frame_times (list[float]): start times of frames
+        scroll_delay (float): planned seconds between two frames
+
+    Returns:
+        list[float]: absolute deviation of every scroll frame interval in seconds
+    """
+    intervals = [later - earlier for earlier, later in zip(frame_times, frame_times[1:])]
+    return [abs(interval - scroll_delay) for interval in intervals if interval < 1.5 * scroll_delay]
+
+def main():
+    parser = argparse.ArgumentParser(description="runs HomeDisplayPi on emulated displays, sensors and inverter and measures performance")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of steady state measurement")
+    parser.add_argument("--port", type=int, default=8082, help="port of fake inverter")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds fake inverter waits before every answer")
+    parser.add_argument("--jitter", type=float, default=0.02, help="additional random seconds before every answer")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="probability that an inverter request fails")
+    parser.add_argument("--dht-read-time", type=float, default=0.5, help="seconds one DHT11 reading blocks")
+    args = parser.parse_args()
+
+    # same sources as main.py, shorter durations for more scrolls per minute
+    data_sources_info:dict[str:dict[str:any]] = {"load_total_active_power" : {"name" : "Verbrauch", "alias_and_unit" : "V W", "duration": 5},
+                                                "total_dcpower" : {"name" : "PV-in", "alias_and_unit" : "P W", "duration" : 5},
+                                                "battery_soc" : {"name" : "Batterie", "alias_and_unit" : "B %", "duration": 5},
+                                                "temperature" : {"name" : "Temperatur", "alias_and_unit" : "T C", "duration": 5},
+                                                "humidity" : {"name" : "Luftfeuchtigkeit", "alias_and_unit" : "L %", "duration": 5}}
+
+    inverter = FakeInverter(port=args.port, latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate, seed=1)
+    inverter.start()
+    w1_tree = FakeW1Tree()
+    w1_tree.set_temperature("000007a1b2c3", 21.437)
+    dht = ScriptedDHT([(45.0, 21.0), (46.0, 21.0), (None, None), (46.0, 22.0)], read_time=args.dht_read_time)
+    matrix_serial = VirtualMax7219(cascaded=2)
+    segment_serial = VirtualMax7219(cascaded=1)
+
+    start = time.monotonic()
+    controller = display_controller.DisplayController(data_sources_info, "127.0.0.1", "user", "pw1111", args.port,
+                                                      inverters=[{"name": "inverter", "ip": "127.0.0.1", "port": args.port,
+                                                                  "web_port": args.port}], # fake inverter serves translations too
+                                                      n_cascading_matrix=2, rotation_matrix=2,
+                                                      matrix_serial=matrix_serial, segment_serial=segment_serial,
+                                                      climate_obj=temperature_and_humidity_data.TemperatureAndHumidity(w1_tree.directory, dht))
+    controller.start_sampling_threads()
+    controller.start_auto_update_thread()
+    controller.start_update_thread()
+
+    while len(controller.get_startup_report()) < len(controller.startup_stages) and time.monotonic() - start < 60:
+        time.sleep(0.05)
+    startup_report = controller.get_startup_report()
+
+    # steady state
+    matrix_serial.reset_stats()
+    segment_serial.reset_stats()
+    metrics.program_metrics.reset()
+    time.sleep(args.duration)
+    jitter = get_scroll_jitter(matrix_serial.get_frame_times(), controller.matrix_display_obj.scroll_delay)
+    matrix_bytes = matrix_serial.get_bytes_per_minute()
+    segment_bytes = segment_serial.get_bytes_per_minute()
+    stats = controller.get_stats()
+    histograms = stats["metrics"]["histograms"]
+    controller.stop()
+    inverter.stop()
+    w1_tree.close()
+
+    print("startup (s since start):")
+    for stage in controller.startup_stages:
+        print("  %-20s %s" % (stage, "%.3f" % startup_report[stage] if stage in startup_report else "not reached"))
+    inverter_stats = stats["inverter"]["endpoints"]["inverter"]
+    print("inverter requests:           ", inverter_stats["requests"], "failed", inverter_stats["failed_requests"],
+          "reconnects", inverter_stats["reconnects"], "fake inverter", inverter.get_stats())
+    for name in ("inverter.request", "inverter.combine", "fetch.climate", "matrix.frame", "matrix.scroll_jitter",
+                 "lock.controller.hold", "lock.controller.wait"):
+        print("%-29s" % (name + " (ms):"), format_histogram(histograms.get(name)))
+    print("SPI frame jitter (ms):       ", summarize(jitter))
+    print("SPI bytes per minute:         matrix %.0f  seven segment %.0f" % (matrix_bytes, segment_bytes))
+    print("counters:                    ", stats["metrics"]["counters"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# just to use config as module
\ No newline at end of file
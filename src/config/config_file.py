@@ -0,0 +1,132 @@
+import os
+import copy
+import json
+import datetime
+
+from data_sources.polling_governor import PollingPolicy
+from data_sources.inverter_group import InverterGroup
+
+# all settings with their defaults, config.json only has to contain changed ones
+DEFAULT_CONFIG:dict[str:any] = {"data_sources_info": {},
+                                "inverter_ip": None,
+                                "username": "user",
+                                "password": "pw1111",
+                                "port": 443,
+                                "inverter_locale": "en_US",
+                                "web_port": None,
+                                "inverter_cache_ttl": 1.0,
+                                "inverters": None,
+                                "n_cascading_matrix": 1,
+                                "block_orientation_matrix": 0,
+                                "rotation_matrix": 0,
+                                "inreverse_matrix": False,
+                                "n_cascading_segment": 1,
+                                "dim_start": "20:00",
+                                "dim_end": "08:00",
+                                "background_sampling": True,
+                                "adaptive_polling": True,
+                                "history_dir": None,
+                                "stats_file": None,
+                                "stats_interval": 60,
+                                "api_host": "0.0.0.0",
+                                "api_port": None}
+PATH_KEYS = ("history_dir", "stats_file") # relative paths are relative to the folder of the config file
+INVERTER_KEYS = ("inverter_ip", "username", "password", "port", "inverter_locale", "web_port", "inverters") # connection of inverters
+DIMMING_KEYS = ("dim_start", "dim_end")
+RESTART_KEYS = ("inverter_cache_ttl", "n_cascading_matrix", "block_orientation_matrix", "rotation_matrix", "inreverse_matrix",
+                "n_cascading_segment", "background_sampling", "adaptive_polling", "history_dir", "stats_file", "api_host", "api_port")
+REQUIRED_SOURCE_KEYS = ("name", "alias_and_unit", "duration")
+
+def load_config(path:str) -> dict[str:any]:
+    """reads config file and completes it with defaults
+    Args:
+        path (str): JSON config file (e.g. config.json)
+
+    Returns:
+        dict[str:any]: all settings
+
+    Raises:
+        OSError: if file can't be read
+        ValueError: if file is no valid JSON or a setting is invalid
+    """
+    with open(path, "r") as c_file:
+        file_config = json.load(c_file) # json.JSONDecodeError is a ValueError
+    if not isinstance(file_config, dict):
+        raise ValueError("config must be a JSON object")
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    for key, value in file_config.items():
+        if key not in DEFAULT_CONFIG:
+            print("Config: unknown setting", key)
+            continue
+        config[key] = value
+    for key in PATH_KEYS:
+        if config[key] is not None:
+            config[key] = os.path.join(os.path.dirname(os.path.abspath(path)), config[key])
+    validate_config(config)
+    return config
+
+def validate_config(config:dict[str:any]):
+    """checks settings which would break the program while running
+    Args:
+        config (dict[str:any]): all settings
+
+    Raises:
+        ValueError: if a setting is invalid
+    """
+    if not config["data_sources_info"]:
+        raise ValueError("no data sources")
+    for source, info in config["data_sources_info"].items():
+        missing = [key for key in REQUIRED_SOURCE_KEYS if key not in info]
+        if missing:
+            raise ValueError(f"data source {source} has no {', '.join(missing)}")
+        validate_source(source, info)
+    for key in DIMMING_KEYS:
+        datetime.time.fromisoformat(config[key]) # ValueError if no time
+    if config["inverters"] is None and config["inverter_ip"] is None:
+        raise ValueError("neither inverter_ip nor inverters set")
+
+def validate_source(source:str, info:dict[str:any]):
+    """checks optional entries of a data source which are applied while running (polling policy and aggregation)
+    Args:
+        source (str): name of source
+        info (dict[str:any]): data_sources_info entry of source
+
+    Raises:
+        ValueError: if "polling" or "aggregate" is invalid
+    """
+    if not isinstance(info.get("polling", {}), dict):
+        raise ValueError(f"polling of data source {source} must be a JSON object")
+    for key, value in info.get("polling", {}).items():
+        if key != "idle_between" and value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            raise ValueError(f"polling {key} of data source {source} must be a number")
+    try:
+        PollingPolicy.from_info(info, 1.0) # unknown parameters raise TypeError, invalid idle_between times ValueError
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"invalid polling of data source {source}: {e}") from e
+    if "aggregate" in info and info["aggregate"] not in InverterGroup.AGGREGATIONS:
+        raise ValueError(f"aggregate of data source {source} must be one of {', '.join(InverterGroup.AGGREGATIONS)}")
+
+def get_inverter_endpoints(config:dict[str:any]) -> list[dict[str:any]]:
+    """returns all inverters of config
+    Args:
+        config (dict[str:any]): all settings
+
+    Returns:
+        list[dict[str:any]]: inverters (one named "inverter" if inverters isn't set)
+    """
+    if config["inverters"] is not None:
+        return config["inverters"]
+    return [{"name": "inverter", "ip": config["inverter_ip"], "username": config["username"], "password": config["password"],
+             "port": config["port"], "locale": config["inverter_locale"], "web_port": config["web_port"]}]
+
+def diff_configs(old:dict[str:any], new:dict[str:any]) -> list[str]:
+    """returns changed settings
+    Args:
+        old (dict[str:any]): settings in use
+        new (dict[str:any]): settings of changed file
+
+    Returns:
+        list[str]: keys of changed settings (in order of DEFAULT_CONFIG)
+    """
+    return [key for key in DEFAULT_CONFIG
+            if old.get(key) != new.get(key) or (key == "data_sources_info" and list(old[key]) != list(new[key]))] # dicts are equal in any order
@@ -0,0 +1,80 @@
+from config import config_file
+from config.file_watcher import FileWatcher
+from monitoring import metrics
+
+class ConfigReloader:
+    def __init__(self, path:str, controller, config:dict[str:any]):
+        """applies changes of the config file while running, only the parts concerned by changed settings are re-initialized
+        (displays, sensor detection and readings of unchanged sources are kept)
+        Args:
+            path (str): config file
+            controller (DisplayController): controller created from config
+            config (dict[str:any]): settings the controller was created with
+        """
+        self.path = path
+        self.controller = controller
+        self.start_config:dict[str:any] = config # settings of hardware, threads and files
+        self.config:dict[str:any] = config # settings in use
+        self.watcher = FileWatcher(path, self.reload)
+
+    def reload(self):
+        """reads config file and applies changed settings, an invalid file is ignored (settings in use stay)
+        """
+        try:
+            new_config = config_file.load_config(self.path)
+        except (OSError, ValueError) as e:
+            metrics.increment("errors.config." + type(e).__name__)
+            print("Config not reloaded:", e)
+            return
+        changes = config_file.diff_configs(self.config, new_config)
+        if not changes:
+            return
+        with metrics.timer("config.reload"):
+            failed = self.apply(changes, self.config, new_config)
+        for key in failed: # old setting stays in use, so next save applies it again
+            new_config[key] = self.config[key]
+        self.config = new_config
+        metrics.increment("config.reloads")
+        print("Config reloaded:", ", ".join(key for key in changes if key not in failed))
+
+    def apply(self, changes:list[str], old_config:dict[str:any], new_config:dict[str:any]) -> list[str]:
+        """re-initializes the parts concerned by changed settings, a failing part is reported and doesn't stop the others
+        Args:
+            changes (list[str]): keys of changed settings
+            old_config (dict[str:any]): settings in use
+            new_config (dict[str:any]): settings of changed file
+
+        Returns:
+            list[str]: keys of changed settings which couldn't be applied
+        """
+        parts = [] # (keys of part, function applying part)
+        if "data_sources_info" in changes: # rotation, durations, names, sampling intervals
+            parts.append((["data_sources_info"],
+                          lambda: self.controller.reconfigure_data_sources(old_config["data_sources_info"], new_config["data_sources_info"])))
+        if any(key in changes for key in config_file.DIMMING_KEYS): # dimming policy only
+            parts.append((config_file.DIMMING_KEYS, lambda: self.controller.set_dimming_window(new_config["dim_start"], new_config["dim_end"])))
+        if any(key in changes for key in config_file.INVERTER_KEYS): # sessions of changed inverters only
+            parts.append((config_file.INVERTER_KEYS,
+                          lambda: self.controller.solar_obj.update_endpoints(config_file.get_inverter_endpoints(new_config))))
+        if "stats_interval" in changes and self.controller.stats_dumper is not None:
+            parts.append((["stats_interval"], lambda: setattr(self.controller.stats_dumper, "interval", new_config["stats_interval"]))) # used after current wait
+        failed = []
+        for keys, apply_function in parts:
+            try:
+                apply_function()
+            except Exception as e: # other parts are applied anyway
+                metrics.increment("errors.config." + type(e).__name__)
+                print("Config:", ", ".join(key for key in keys if key in changes), "not applied:", type(e).__name__, e)
+                failed.extend(key for key in keys if key in changes)
+        for key in changes:
+            if key in config_file.RESTART_KEYS and new_config[key] != self.start_config[key]:
+                print("Config:", key, "is applied after restart")
+        return failed
+
+    def start(self):
+        """starts watching the config file
+        """
+        self.watcher.start()
+
+    def stop(self):
+        self.watcher.stop()
@@ -0,0 +1,145 @@
+import os
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+
+# inotify constants of <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008 # file written and closed (editors saving in place)
+IN_MOVED_TO = 0x00000080 # file moved into folder (editors saving to a temporary file first)
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct("iIII") # wd, mask, cookie, len of name
+
+class FileWatcher:
+    def __init__(self, path:str, on_change, poll_interval:float=2.0, settle_time:float=0.2):
+        """calls on_change when file is saved, watched with inotify (Linux) or by polling its modification time
+        Args:
+            path (str): watched file
+            on_change (function): function without parameters (called in watcher thread)
+            poll_interval (float): seconds between two checks if inotify isn't available
+            settle_time (float): seconds to wait after a change, so several writes of one save cause one call
+        """
+        self.path = os.path.abspath(path)
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.method:str = None # "inotify" or "polling" while running
+        self.changes:int = 0 # calls of on_change
+        self.stop_event = threading.Event()
+        self.wakeup_pipe:tuple = None # (read end, write end) to end select() on stop
+        self.thread:threading.Thread = None
+
+    def open_inotify(self) -> int:
+        """watches folder of file (saving may replace the file, which would end a watch of the file itself)
+        Returns:
+            int: inotify file descriptor, None if inotify isn't available
+        """
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError): # no libc or no inotify (e.g. macOS)
+            return None
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, os.fsencode(os.path.dirname(self.path)), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE) < 0:
+            os.close(fd)
+            return None
+        return fd
+
+    def read_events(self, fd:int) -> bool:
+        """reads all pending inotify events
+        Args:
+            fd (int): inotify file descriptor
+
+        Returns:
+            bool: True if an event concerns the watched file
+        """
+        name = os.fsencode(os.path.basename(self.path))
+        found = False
+        while True:
+            try:
+                data = os.read(fd, 4096)
+            except BlockingIOError: # no more events
+                return found
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            offset = 0
+            while offset < len(data):
+                _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                if data[offset:offset + length].rstrip(b"\0") == name:
+                    found = True
+                offset += length
+
+    def watch_inotify(self, fd:int):
+        while not self.stop_event.is_set():
+            ready, _, _ = select.select([fd, self.wakeup_pipe[0]], [], [])
+            if fd not in ready: # stopped
+                continue
+            if not self.read_events(fd):
+                continue
+            if self.stop_event.wait(self.settle_time):
+                break
+            self.read_events(fd) # events of the same save
+            self.notify()
+
+    def get_mtime(self) -> float:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError: # replaced at the moment
+            return None
+
+    def watch_polling(self):
+        last_mtime = self.get_mtime()
+        while not self.stop_event.wait(self.poll_interval):
+            mtime = self.get_mtime()
+            if mtime is not None and mtime != last_mtime:
+                last_mtime = mtime
+                self.notify()
+
+    def notify(self):
+        self.changes += 1
+        try:
+            self.on_change()
+        except Exception as e: # watcher keeps running
+            print("FileWatcher error:", type(e).__name__, e)
+
+    def run(self):
+        fd = self.open_inotify()
+        if fd is None:
+            self.method = "polling"
+            self.watch_polling()
+            return
+        self.method = "inotify"
+        try:
+            self.watch_inotify(fd)
+        finally:
+            os.close(fd)
+
+    def start(self):
+        """starts watcher thread (does nothing if already started)
+        """
+        if self.thread is not None:
+            return
+        self.wakeup_pipe = os.pipe()
+        self.thread = threading.Thread(target=self.run, name="file-watcher", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """stops watcher thread
+        """
+        self.stop_event.set()
+        if self.thread: # if thread is not None
+            os.write(self.wakeup_pipe[1], b"x")
+            self.thread.join()
+            for end in self.wakeup_pipe:
+                os.close(end)
+
+    def get_stats(self) -> dict[str:any]:
+        return {"method": self.method, "changes": self.changes}
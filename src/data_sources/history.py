@@ -0,0 +1,263 @@
+import os
+import mmap
+import struct
+import threading
+import time
+
+class HistoryBuffer:
+    HEADER = struct.Struct("<4sIII") # magic, capacity, head (next write index), count
+    MAGIC = b"HDP1"
+
+    def __init__(self, path:str=None, capacity:int=131072, trend_window:int=10, trend_threshold:float=0.02):
+        """fixed-size ring buffer of (timestamp, value) samples stored as float64 and float32 arrays in one memory map.
+        Appending only touches the written sample and the header, so the file is never rewritten.
+        Args:
+            path (str): file to persist samples in (None for memory only)
+            capacity (int): maximum number of samples, oldest are overwritten - [> 2 * trend_window]
+            trend_window (int): number of latest samples compared with the samples before for the trend
+            trend_threshold (float): relative change of average needed for a rising or falling trend
+        """
+        self.path = path
+        self.capacity = capacity
+        self.trend_window = trend_window
+        self.trend_threshold = trend_threshold
+        self.lock = threading.Lock() # appends and reads come from different threads
+        size = self.HEADER.size + capacity * (8 + 4) # header + timestamps (float64) + values (float32)
+
+        if path is None:
+            self.file = None
+            self.map = mmap.mmap(-1, size)
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.file = open(path, "a+b")
+            if os.path.getsize(path) != size: # new file or other capacity
+                self.file.truncate(0)
+                self.file.truncate(size)
+            self.map = mmap.mmap(self.file.fileno(), size)
+
+        magic, stored_capacity, self.head, self.count = self.HEADER.unpack_from(self.map, 0)
+        if magic != self.MAGIC or stored_capacity != capacity or self.head >= capacity or self.count > capacity:
+            self.head = 0
+            self.count = 0
+            self.map[:] = bytes(size) # fresh buffer
+            self.write_header()
+
+        timestamps_end = self.HEADER.size + capacity * 8
+        self.timestamps = memoryview(self.map)[self.HEADER.size:timestamps_end].cast("d")
+        self.values = memoryview(self.map)[timestamps_end:].cast("f")
+        self.recompute_aggregates()
+
+    def write_header(self):
+        self.HEADER.pack_into(self.map, 0, self.MAGIC, self.capacity, self.head, self.count)
+
+    def index(self, age:int) -> int:
+        """returns array index of a sample
+        Args:
+            age (int): 0 for latest sample, 1 for the one before, ...
+
+        Returns:
+            int: index in timestamps and values
+        """
+        return (self.head - 1 - age) % self.capacity
+
+    def recompute_aggregates(self):
+        """computes sum, min, max and trend windows from stored samples (at start and to avoid rounding drift)
+        """
+        stored = [self.values[self.index(age)] for age in range(self.count)] # latest first
+        self.total_sum = sum(stored)
+        self.min_value = min(stored) if stored else None
+        self.max_value = max(stored) if stored else None
+        self.min_max_valid = True
+        window = self.trend_window
+        self.recent_sum = sum(stored[:window])
+        self.previous_sum = sum(stored[window:2 * window])
+
+    def append(self, value:float, timestamp:float=None):
+        """stores sample in O(1), overwrites oldest sample if full
+        Args:
+            value (float): measured value
+            timestamp (float): unix time of value (now if None)
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        with self.lock:
+            i = self.head
+            if self.count == self.capacity: # oldest sample is overwritten
+                evicted = self.values[i]
+                self.total_sum -= evicted
+                if evicted == self.min_value or evicted == self.max_value:
+                    self.min_max_valid = False # recomputed lazily
+            self.timestamps[i] = timestamp
+            self.values[i] = value
+            value = self.values[i] # float32 rounded value
+            self.head = (i + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+            self.write_header()
+
+            self.total_sum += value
+            if self.min_max_valid:
+                self.min_value = value if self.min_value is None else min(self.min_value, value)
+                self.max_value = value if self.max_value is None else max(self.max_value, value)
+
+            # sample leaving recent window moves into previous window
+            window = self.trend_window
+            self.recent_sum += value
+            if self.count > window:
+                moved = self.values[self.index(window)]
+                self.recent_sum -= moved
+                self.previous_sum += moved
+            if self.count > 2 * window:
+                self.previous_sum -= self.values[self.index(2 * window)]
+
+            if self.head == 0: # once per round, avoids rounding drift of the sums
+                self.recompute_aggregates()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def get_latest(self) -> tuple:
+        """returns latest sample
+        Returns:
+            tuple: (timestamp, value), None if empty
+        """
+        with self.lock:
+            if self.count == 0:
+                return None
+            i = self.index(0)
+            return (self.timestamps[i], self.values[i])
+
+    def get_aggregates(self) -> dict[str:float]:
+        """returns min, max and average of all stored samples
+        Returns:
+            dict[str:float]: "min", "max", "avg" (None if empty) and "count"
+        """
+        with self.lock:
+            if self.count == 0:
+                return {"min": None, "max": None, "avg": None, "count": 0}
+            if not self.min_max_valid:
+                stored = [self.values[self.index(age)] for age in range(self.count)]
+                self.min_value = min(stored)
+                self.max_value = max(stored)
+                self.min_max_valid = True
+            return {"min": self.min_value, "max": self.max_value, "avg": self.total_sum / self.count, "count": self.count}
+
+    def get_trend(self) -> int:
+        """compares average of the latest trend_window samples with the trend_window samples before
+        Returns:
+            int: 1 rising, -1 falling, 0 steady or not enough samples
+        """
+        with self.lock:
+            window = self.trend_window
+            if self.count < 2 * window:
+                return 0
+            recent = self.recent_sum / window
+            previous = self.previous_sum / window
+            if abs(recent - previous) <= self.trend_threshold * max(abs(previous), 1.0):
+                return 0
+            return 1 if recent > previous else -1
+
+    def get_samples(self, since:float=None) -> list[tuple]:
+        """returns stored samples, oldest first
+        Args:
+            since (float): only samples newer than this unix time (all if None)
+
+        Returns:
+            list[tuple]: (timestamp, value) pairs
+        """
+        with self.lock:
+            samples = []
+            for age in range(self.count):
+                i = self.index(age)
+                if since is not None and self.timestamps[i] <= since:
+                    break
+                samples.append((self.timestamps[i], self.values[i]))
+            samples.reverse()
+            return samples
+
+    def flush(self):
+        """writes changed pages to file
+        """
+        if self.file is not None:
+            self.map.flush()
+
+    def close(self):
+        """flushes and closes memory map and file
+        """
+        self.flush()
+        self.timestamps.release()
+        self.values.release()
+        self.map.close()
+        if self.file is not None:
+            self.file.close()
+
+class History:
+    def __init__(self, directory:str=None, capacity:int=131072, min_interval:float=60):
+        """history of all data sources, one ring buffer (and file) per source
+        Args:
+            directory (str): folder for history files (None for memory only)
+            capacity (int): maximum samples per source (131072 samples = 1.5 MB, 3 months at one sample per minute)
+            min_interval (float): seconds between two stored samples of a source, more frequent readings are skipped
+        """
+        self.directory = directory
+        self.capacity = capacity
+        self.min_interval = min_interval
+        self.buffers:dict[str:HistoryBuffer] = {}
+        self.last_times:dict[str:float] = {} # source -> monotonic time of last stored sample
+        self.lock = threading.Lock() # protects buffers
+
+    def get_buffer(self, source:str) -> HistoryBuffer:
+        """returns ring buffer of source, opens it on first use
+        Args:
+            source (str): unique name of data source
+
+        Returns:
+            HistoryBuffer: buffer of source
+        """
+        with self.lock:
+            if source not in self.buffers:
+                path = None if self.directory is None else os.path.join(self.directory, source + ".hist")
+                self.buffers[source] = HistoryBuffer(path, self.capacity)
+            return self.buffers[source]
+
+    def add(self, source:str, value):
+        """stores reading of source if numeric and min_interval has passed
+        Args:
+            source (str): unique name of data source
+            value (any): reading ("no data" and None are skipped)
+        """
+        if not isinstance(value, (int, float)):
+            return
+        now = time.monotonic()
+        last_time = self.last_times.get(source)
+        if last_time is not None and now - last_time < self.min_interval:
+            return
+        self.last_times[source] = now
+        self.get_buffer(source).append(value)
+
+    def get_trend(self, source:str) -> int:
+        """returns trend of source
+        Args:
+            source (str): unique name of data source
+
+        Returns:
+            int: 1 rising, -1 falling, 0 steady or unknown
+        """
+        return self.get_buffer(source).get_trend()
+
+    def get_aggregates(self, source:str) -> dict[str:float]:
+        """returns min, max and average of source
+        Args:
+            source (str): unique name of data source
+
+        Returns:
+            dict[str:float]: "min", "max", "avg" and "count"
+        """
+        return self.get_buffer(source).get_aggregates()
+
+    def close(self):
+        """flushes and closes all buffers
+        """
+        with self.lock:
+            for buffer in self.buffers.values():
+                buffer.close()
+            self.buffers = {}
@@ -0,0 +1,284 @@
+import threading
+
+from data_sources.solar_data import SolarData, CircuitBreaker
+from data_sources.sungrow_session import EventLoopThread
+from data_sources.registry import DataSourceBackend
+from monitoring import metrics
+
+ENDPOINT_SEPARATOR = "@" # key of an item of one inverter: <item>@<inverter name> (e.g. "total_dcpower@garage")
+ADDITIVE_UNITS = ("W", "Wh", "kWh", "MWh", "var", "kvar", "VA", "kVA") # power and energy of several inverters add up
+
+def mean(values:list[float]) -> float:
+    return sum(values) / len(values)
+
+class InverterGroup(DataSourceBackend):
+    name = "inverter"
+    fetch_metric = "inverter.combine" # fetch only combines pushed snapshots, requests to the inverters are timed as "inverter.request"
+    AGGREGATIONS = {"sum": sum, "mean": mean, "min": min, "max": max} # combinations of an item of all inverters
+
+    def __init__(self, endpoints:list[dict[str:any]], cache_ttl:float=1.0, aggregations:dict[str:str]=None, max_stale_age:float=300.0):
+        """one or more inverters polled concurrently on one event loop. Every item key is the combination of the item of all inverters
+        (e.g. summed "total_dcpower"), <item>@<inverter name> is the item of one inverter. Each inverter has its own connection health,
+        so a slow or offline inverter only drops out of the combination (after max_stale_age) and never delays the others.
+        Args:
+            endpoints (list[dict[str:any]]): one dict per inverter - "name", "ip", optional "username", "password", "port", "locale" and "web_port"
+            cache_ttl (float): seconds between two polls of each inverter
+            aggregations (dict[str:str]): item key -> combination of its values ("sum", "mean", "min" or "max"), items not listed are
+                                          summed if they are power or energy, otherwise averaged (e.g. battery_soc, temperatures)
+            max_stale_age (float): seconds the last known values of an unreachable inverter are combined
+        """
+        super().__init__()
+        self.cache_ttl = cache_ttl
+        self.sample_interval = cache_ttl # background readings are served from the pushed snapshots
+        self.aggregations:dict[str:str] = {}
+        self.set_aggregations(aggregations or {})
+        self.listeners:list = [] # callbacks getting the combined snapshot after every pushed snapshot
+        self.reported_missing_items:set = set() # unknown item names already printed once
+        self.reported_lock = threading.Lock()
+
+        self.max_stale_age = max_stale_age
+        self.loop_thread = EventLoopThread("inverters") # sessions of all inverters share one loop, polls run concurrently
+        self.endpoint_configs:dict[str:dict[str:any]] = {} # inverter name -> endpoint dict it was created from
+        self.endpoints:dict[str:SolarData] = {} # inverter name -> inverter, replaced as a whole when inverters change
+        for endpoint in endpoints:
+            self.endpoint_configs[self.get_endpoint_name(endpoint)] = endpoint
+            self.endpoints[self.get_endpoint_name(endpoint)] = self.create_endpoint(endpoint)
+
+    def get_endpoint_name(self, endpoint:dict[str:any]) -> str:
+        return endpoint.get("name", endpoint["ip"])
+
+    def create_endpoint(self, endpoint:dict[str:any]) -> SolarData:
+        """creates session of one inverter on the shared loop (connected by its startup stage)
+        Args:
+            endpoint (dict[str:any]): "ip", optional "username", "password", "port", "locale" and "web_port"
+
+        Returns:
+            SolarData: inverter
+        """
+        inverter = SolarData(endpoint["ip"], endpoint.get("username", "user"), endpoint.get("password", "pw1111"),
+                             endpoint.get("port", 443), locale=endpoint.get("locale", "en_US"), cache_ttl=self.cache_ttl,
+                             loop_thread=self.loop_thread, max_stale_age=self.max_stale_age, web_port=endpoint.get("web_port"))
+        inverter.add_listener(self.on_endpoint_snapshot)
+        return inverter
+
+    def update_endpoints(self, endpoints:list[dict[str:any]]):
+        """recreates the sessions of changed inverters only (e.g. new password), the others keep polling
+        Args:
+            endpoints (list[dict[str:any]]): all inverters (like in __init__)
+        """
+        new_configs = {self.get_endpoint_name(endpoint): endpoint for endpoint in endpoints}
+        new_endpoints = {}
+        created = [] # (name, inverter) of new sessions
+        for endpoint_name, endpoint in new_configs.items():
+            if self.endpoint_configs.get(endpoint_name) == endpoint:
+                new_endpoints[endpoint_name] = self.endpoints[endpoint_name]
+            else:
+                new_endpoints[endpoint_name] = self.create_endpoint(endpoint)
+                created.append((endpoint_name, new_endpoints[endpoint_name]))
+        replaced = [inverter for endpoint_name, inverter in self.endpoints.items() if new_endpoints.get(endpoint_name) is not inverter]
+        self.endpoint_configs = new_configs
+        self.endpoints = new_endpoints # replaced at once, running readings keep old dict
+        for inverter in replaced:
+            inverter.close()
+        for endpoint_name, inverter in created: # connect in background like at startup
+            for _, connect_function in inverter.get_startup_stages():
+                threading.Thread(target=connect_function, name="connect-" + endpoint_name, daemon=True).start()
+
+    def set_aggregations(self, aggregations:dict[str:str]):
+        """changes the combinations of items (e.g. after config reload)
+        Args:
+            aggregations (dict[str:str]): item key -> combination of its values ("sum", "mean", "min" or "max")
+
+        Raises:
+            ValueError: if a combination is unknown (aggregations in use stay)
+        """
+        for item_name, aggregation in aggregations.items():
+            if aggregation not in self.AGGREGATIONS:
+                raise ValueError(f"unknown aggregate {aggregation} of {item_name}, use one of {', '.join(self.AGGREGATIONS)}")
+        self.aggregations = dict(aggregations) # replaced at once, running fetches keep old dict
+
+    def get_default_aggregation(self, unit:str) -> str:
+        """returns combination of an item without configured aggregate
+        Args:
+            unit (str): unit of item (e.g. "W", "%")
+
+        Returns:
+            str: "sum" for power and energy, "mean" for all other items (e.g. percentages, temperatures, voltages)
+        """
+        return "sum" if unit in ADDITIVE_UNITS else "mean"
+
+    def aggregate(self, item_name:str, values:list, unit:str=None) -> any:
+        """combines the values of an item of several inverters
+        Args:
+            item_name (str): key of item
+            values (list): value of each inverter having the item
+            unit (str): unit of item, chooses the combination if item has no configured aggregate
+
+        Returns:
+            any: combined value, value of first inverter if not numeric (e.g. states)
+        """
+        if len(values) == 1:
+            return values[0]
+        try:
+            numbers = [float(value) for value in values]
+        except (TypeError, ValueError):
+            return values[0]
+        return self.AGGREGATIONS[self.aggregations.get(item_name, self.get_default_aggregation(unit))](numbers)
+
+    def get_combined_snapshot(self) -> dict[str:any]:
+        """combines the cached snapshots of all inverters without any request
+        Returns:
+            dict[str:any]: combined items and <item>@<inverter name> items with their values
+        """
+        combined = {}
+        collected:dict[str:list] = {} # item -> values of all inverters
+        units:dict[str:str] = {} # item -> unit
+        for endpoint_name, inverter in list(self.endpoints.items()):
+            inverter_units = inverter.units
+            for item_name, value in inverter.get_current_snapshot().items():
+                combined[item_name + ENDPOINT_SEPARATOR + endpoint_name] = value
+                collected.setdefault(item_name, []).append(value)
+                units.setdefault(item_name, inverter_units.get(item_name))
+        for item_name, values in collected.items():
+            combined[item_name] = self.aggregate(item_name, values, units[item_name])
+        return combined
+
+    def on_endpoint_snapshot(self, snapshot:dict[str:any]):
+        """forwards the combined snapshot to listeners whenever one inverter pushed a snapshot
+        Args:
+            snapshot (dict[str:any]): items of the inverter
+        """
+        combined = self.get_combined_snapshot()
+        for callback in self.listeners:
+            try:
+                callback(combined)
+            except Exception as e: # a bug of a listener (e.g. display) must not count as failure of the inverter
+                metrics.increment("errors.listener." + type(e).__name__)
+                print("Listener error:", type(e).__name__, e)
+
+    def add_listener(self, callback):
+        """registers callback which gets the combined snapshot after every pushed snapshot (must not block)
+        Args:
+            callback (function): function with combined snapshot (dict[str:any]) as parameter
+        """
+        self.listeners.append(callback)
+
+    def get_keys(self) -> list[str]:
+        """returns keys of all combined items and items of each inverter
+        Returns:
+            list[str]: keys of inverter items
+        """
+        return list(self.get_combined_snapshot().keys())
+
+    def fetch(self, keys:list[str]) -> dict[str:any]:
+        """returns several items from the snapshots pushed by the polls, never waits for an inverter
+        Args:
+            keys (list[str]): keys of combined items or <item>@<inverter name>
+
+        Returns:
+            dict[str:any]: value of each item, None if not available
+        """
+        combined = self.get_combined_snapshot()
+        values = {}
+        for key in keys:
+            if combined and key not in combined and self.is_complete():
+                with self.reported_lock:
+                    if key not in self.reported_missing_items: # print only once
+                        self.reported_missing_items.add(key)
+                        print("KeyError: Key", key, "is no item of inverter")
+            values[key] = combined.get(key)
+        return values
+
+    def is_complete(self) -> bool:
+        """returns if all inverters have delivered values (missing items are really unknown then)
+        """
+        return all(inverter.get_current_snapshot() for inverter in self.endpoints.values())
+
+    def get_endpoints_of(self, key:str) -> list[SolarData]:
+        """returns inverters whose values make up an item
+        Args:
+            key (str): key of combined item or <item>@<inverter name>
+
+        Returns:
+            list[SolarData]: inverter of <item>@<inverter name>, otherwise all inverters having the item
+        """
+        item_name, separator, endpoint_name = key.partition(ENDPOINT_SEPARATOR)
+        if separator:
+            inverter = self.endpoints.get(endpoint_name)
+            return [] if inverter is None else [inverter]
+        return [inverter for inverter in list(self.endpoints.values()) if item_name in inverter.get_current_snapshot()]
+
+    def is_stale(self, key:str) -> bool:
+        """returns if an item is made up of last known values (a combined item also if an inverter dropped out of the combination)
+        Args:
+            key (str): key of combined item or <item>@<inverter name>
+
+        Returns:
+            bool: True if an inverter of the item is unreachable
+        """
+        if ENDPOINT_SEPARATOR in key:
+            return any(inverter.is_stale() for inverter in self.get_endpoints_of(key))
+        return any(inverter.is_stale() for inverter in list(self.endpoints.values()))
+
+    def get_value_time(self, key:str) -> float:
+        """returns when the values of an item were fetched
+        Args:
+            key (str): key of combined item or <item>@<inverter name>
+
+        Returns:
+            float: Unix time of oldest fetch the item is made up of, None if not fetched yet
+        """
+        times = [inverter.get_value_time() for inverter in self.get_endpoints_of(key) if inverter.get_value_time() is not None]
+        return min(times) if times else None
+
+    def get_startup_stages(self) -> list[tuple]:
+        """returns first request of each inverter as startup stage, they are connected concurrently
+        Returns:
+            list[tuple]: (stage name, function returning None for all keys), "inverter_connection_<name>" if several inverters
+        """
+        stages = []
+        for endpoint_name, inverter in self.endpoints.items():
+            for stage, connect_function in inverter.get_startup_stages():
+                stages.append((stage if len(self.endpoints) == 1 else stage + "_" + endpoint_name, connect_function))
+        return stages
+
+    def set_poll_interval(self, interval:float):
+        """polls all inverters every interval seconds
+        Args:
+            interval (float): seconds between two requests of each inverter
+        """
+        self.cache_ttl = interval
+        for inverter in self.endpoints.values():
+            inverter.set_poll_interval(interval)
+
+    def get_health(self) -> dict[str:str]:
+        """returns connection health of each inverter
+        Returns:
+            dict[str:str]: inverter name -> "ok", "stale" (last request failed), "offline" (requests paused) or "connecting" (no values yet)
+        """
+        health = {}
+        for endpoint_name, inverter in self.endpoints.items():
+            if inverter.breaker.state != CircuitBreaker.CLOSED:
+                health[endpoint_name] = "offline"
+            elif inverter.get_snapshot_age() is None:
+                health[endpoint_name] = "connecting"
+            elif inverter.is_stale():
+                health[endpoint_name] = "stale"
+            else:
+                health[endpoint_name] = "ok"
+        return health
+
+    def get_stats(self) -> dict[str:any]:
+        """returns health and connection statistics of each inverter
+        Returns:
+            dict[str:any]: "health" and "endpoints" (inverter name -> statistics of SolarData)
+        """
+        return {"health": self.get_health(),
+                "endpoints": {endpoint_name: inverter.get_stats() for endpoint_name, inverter in self.endpoints.items()}}
+
+    def close(self):
+        """closes the sessions of all inverters and their loop
+        """
+        for inverter in self.endpoints.values():
+            inverter.close()
+        self.loop_thread.stop()
@@ -0,0 +1,164 @@
+import datetime
+import threading
+import collections
+
+def is_in_time_window(now:datetime.time, start:datetime.time, end:datetime.time) -> bool:
+    """returns if now is in the window from start to end, the window may span midnight (e.g. 20:00 to 08:00)
+    Args:
+        now (datetime.time): checked time
+        start (datetime.time): first time of window
+        end (datetime.time): first time after window
+
+    Returns:
+        bool: True if start <= now < end
+    """
+    if start <= end:
+        return start <= now < end
+    return now >= start or now < end
+
+class PollingPolicy:
+    def __init__(self, min_interval:float, max_interval:float=None, idle_below:float=None, idle_between:tuple=None,
+                 idle_interval:float=600, window:int=5, volatile_change:float=0.05, flat_change:float=0.01):
+        """polling interval of one data source: short while values change, growing while they are flat, long while idle
+        Args:
+            min_interval (float): seconds between two readings while values change
+            max_interval (float): longest seconds between two readings of flat values (None for 10 * min_interval)
+            idle_below (float): source is idle while value is at most this (e.g. 0 for PV at night, None for any value)
+            idle_between (tuple): source is idle between these times (e.g. ("20:00", "07:00"), None for any time)
+            idle_interval (float): seconds between two readings while idle
+            window (int): number of recent values the latest value is compared with
+            volatile_change (float): relative change which sets min_interval at once
+            flat_change (float): relative change below which the interval grows by half
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval if max_interval is not None else 10 * min_interval
+        self.idle_below = idle_below
+        self.idle_between = None if idle_between is None else tuple(datetime.time.fromisoformat(t) for t in idle_between)
+        self.idle_interval = idle_interval
+        self.volatile_change = volatile_change
+        self.flat_change = flat_change
+        self.recent = collections.deque(maxlen=window)
+        self.interval:float = min_interval
+        self.idle:bool = False
+
+    @classmethod
+    def from_info(cls, info:dict[str:any], default_interval:float) -> "PollingPolicy":
+        """creates policy from the optional "polling" entry of a data source
+        Args:
+            info (dict[str:any]): data_sources_info entry of source
+            default_interval (float): min_interval if neither "polling" nor "refresh_interval" set it
+
+        Returns:
+            PollingPolicy: policy of source
+        """
+        polling = dict(info.get("polling", {}))
+        polling.setdefault("min_interval", info.get("refresh_interval", default_interval))
+        return cls(**polling)
+
+    def is_idle_condition(self, value:float, now:datetime.time=None) -> bool:
+        """returns if idle condition (value and/or time window) is met
+        Args:
+            value (float): latest value
+            now (datetime.time): current time (None for now)
+
+        Returns:
+            bool: if source is idle, False if no idle condition is configured
+        """
+        if self.idle_below is None and self.idle_between is None:
+            return False
+        if self.idle_below is not None and value > self.idle_below:
+            return False
+        if self.idle_between is not None:
+            now = now or datetime.datetime.now().time()
+            if not is_in_time_window(now, *self.idle_between):
+                return False
+        return True
+
+    def observe(self, value) -> float:
+        """adapts interval to a new reading
+        Args:
+            value (any): latest reading (non-numeric readings keep the interval)
+
+        Returns:
+            float: seconds until next reading
+        """
+        try:
+            value = float(value)
+        except (TypeError, ValueError): # no data
+            return self.interval
+        if self.is_idle_condition(value):
+            self.idle = True
+            self.interval = self.idle_interval
+        elif self.idle: # idle ended, e.g. sunrise: read often at once
+            self.idle = False
+            self.interval = self.min_interval
+        elif self.recent:
+            reference = sum(self.recent) / len(self.recent)
+            change = abs(value - reference) / max(abs(reference), 1.0)
+            if change >= self.volatile_change:
+                self.interval = self.min_interval
+            elif change <= self.flat_change:
+                self.interval = min(self.max_interval, self.interval * 1.5)
+        self.recent.append(value)
+        return self.interval
+
+class PollingGovernor:
+    def __init__(self, policies:dict[str:PollingPolicy]=None, on_interval_change=None):
+        """polling interval of one backend: the shortest interval of its sources, because one reading serves all of them
+        Args:
+            policies (dict[str:PollingPolicy]): key -> policy of source
+            on_interval_change (function): function with new interval as parameter (e.g. DataSourceBackend.set_poll_interval)
+        """
+        self.policies:dict[str:PollingPolicy] = dict(policies or {})
+        self.on_interval_change = on_interval_change
+        self.lock = threading.Lock() # policies are added while sampling
+        self.interval:float = self.get_interval()
+
+    def add_policy(self, key:str, policy:PollingPolicy):
+        """adds source found after startup
+        Args:
+            key (str): key of source
+            policy (PollingPolicy): policy of source
+        """
+        with self.lock:
+            self.policies[key] = policy
+
+    def remove_policy(self, key:str):
+        """removes source, its interval doesn't count anymore
+        Args:
+            key (str): key of source
+        """
+        with self.lock:
+            self.policies.pop(key, None)
+
+    def get_interval(self) -> float:
+        intervals = [policy.interval for policy in self.policies.values()]
+        return min(intervals) if intervals else None
+
+    def update(self, values:dict[str:any]) -> float:
+        """adapts intervals of all sources to their new readings
+        Args:
+            values (dict[str:any]): key -> latest reading
+
+        Returns:
+            float: seconds until next reading of backend
+        """
+        with self.lock:
+            for key, value in values.items():
+                if key in self.policies:
+                    self.policies[key].observe(value)
+            interval = self.get_interval()
+            changed = interval != self.interval
+            self.interval = interval
+        if changed and self.on_interval_change is not None:
+            self.on_interval_change(interval)
+        return interval
+
+    def get_stats(self) -> dict[str:any]:
+        """returns current intervals
+        Returns:
+            dict[str:any]: "interval" of backend and interval of each source ("idle" if idle)
+        """
+        with self.lock:
+            return {"interval": self.interval,
+                    "sources": {key: "idle" if policy.idle else round(policy.interval, 2) for key, policy in self.policies.items()}}
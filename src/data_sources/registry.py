@@ -0,0 +1,175 @@
+from monitoring import metrics
+
+class DataSourceBackend:
+    """base of all data source backends (inverter, sensors, ...).
+    A backend declares the keys it provides and reads any number of them in one batch.
+    """
+    name:str = "backend" # unique name of backend
+    sample_interval:float = 5 # default seconds between two background readings
+    fetch_metric:str = None # name of the fetch latency histogram (None for "fetch.<name>")
+
+    def __init__(self):
+        self.key_listeners:list = [] # callbacks getting keys found after startup
+
+    def get_keys(self) -> list[str]:
+        """returns keys of the data sources this backend provides
+        Returns:
+            list[str]: keys (equal to data_sources_info keys)
+        """
+        return []
+
+    def provides(self, key:str) -> bool:
+        """returns if key belongs to this backend (also keys of sensors not found yet)
+        Args:
+            key (str): key of data source
+
+        Returns:
+            bool: if backend provides key
+        """
+        return key in self.get_keys()
+
+    def get_source_info(self, key:str) -> dict[str:any]:
+        """returns data_sources_info entry for a found key which isn't configured
+        Args:
+            key (str): key of data source
+
+        Returns:
+            dict[str:any]: name, alias_and_unit and duration, None if key is only shown when configured
+        """
+        return None
+
+    def add_key_listener(self, callback):
+        """registers callback which gets keys found after startup (e.g. sensor plugged in later)
+        Args:
+            callback (function): function with backend and list of new keys as parameters
+        """
+        self.key_listeners.append(callback)
+
+    def notify_new_keys(self, keys:list[str]):
+        for callback in self.key_listeners:
+            callback(self, keys)
+
+    def fetch(self, keys:list[str]) -> dict[str:any]:
+        """reads several data sources at once (may block)
+        Args:
+            keys (list[str]): keys of requested data sources
+
+        Returns:
+            dict[str:any]: value of each requested key, None if error
+        """
+        raise NotImplementedError
+
+    def is_stale(self, key:str) -> bool:
+        """returns if the value of key is the last known one instead of a fresh one (e.g. inverter unreachable)
+        Args:
+            key (str): key of data source
+
+        Returns:
+            bool: True if served value is outdated
+        """
+        return False
+
+    def get_value_time(self, key:str) -> float:
+        """returns when the served value of key was measured, for backends serving cached values
+        Args:
+            key (str): key of data source
+
+        Returns:
+            float: Unix time of value, None if values are read when requested
+        """
+        return None
+
+    def get_startup_stages(self) -> list[tuple]:
+        """returns detection steps run in background at startup
+        Returns:
+            list[tuple]: (stage name, function without parameters returning detected keys, None for all keys)
+        """
+        return []
+
+    def set_poll_interval(self, interval:float):
+        """adapts own background activity (e.g. polling of inverter) to the interval its sources are read in
+        Args:
+            interval (float): seconds between two readings
+        """
+        pass
+
+    def close(self):
+        """stops background threads and connections of backend
+        """
+        pass
+
+class DataSourceRegistry:
+    def __init__(self):
+        """routes data source keys to the backends providing them
+        """
+        self.backends:list[DataSourceBackend] = []
+        self.fallback:DataSourceBackend = None # gets all keys no other backend declares
+
+    def register(self, backend:DataSourceBackend, fallback:bool=False):
+        """adds backend, new sources plug in here without changing the controller
+        Args:
+            backend (DataSourceBackend): backend to add
+            fallback (bool): backend gets all keys no other backend declares (e.g. inverter items)
+        """
+        self.backends.append(backend)
+        if fallback:
+            self.fallback = backend
+
+    def get_backend(self, key:str) -> DataSourceBackend:
+        """returns backend providing key
+        Args:
+            key (str): key of data source
+
+        Returns:
+            DataSourceBackend: backend of key, None if no backend provides it
+        """
+        for backend in self.backends:
+            if backend is not self.fallback and backend.provides(key):
+                return backend
+        return self.fallback
+
+    def group_keys(self, keys:list[str]) -> dict[DataSourceBackend:list[str]]:
+        """groups keys by their backend
+        Args:
+            keys (list[str]): keys of data sources
+
+        Returns:
+            dict[DataSourceBackend:list[str]]: backend -> its keys (keys without backend are left out)
+        """
+        groups = {}
+        for key in keys:
+            backend = self.get_backend(key)
+            if backend is not None:
+                groups.setdefault(backend, []).append(key)
+        return groups
+
+    def fetch(self, keys:list[str]) -> dict[str:any]:
+        """reads keys with one fetch per backend
+        Args:
+            keys (list[str]): keys of data sources
+
+        Returns:
+            dict[str:any]: value of each key, None if error or no backend provides it
+        """
+        values = dict.fromkeys(keys)
+        for backend, backend_keys in self.group_keys(keys).items():
+            values.update(self.fetch_from(backend, backend_keys))
+        return values
+
+    def fetch_from(self, backend:DataSourceBackend, keys:list[str]) -> dict[str:any]:
+        """reads keys of one backend, records latency (fetch_metric of backend or "fetch.<backend name>") and errors by exception type
+        Args:
+            backend (DataSourceBackend): backend providing keys
+            keys (list[str]): keys of data sources
+
+        Returns:
+            dict[str:any]: value of each key, None if error
+        """
+        with metrics.timer(backend.fetch_metric or "fetch." + backend.name):
+            return backend.fetch(keys)
+
+    def close(self):
+        """closes all backends
+        """
+        for backend in self.backends:
+            backend.close()
@@ -0,0 +1,104 @@
+import threading
+import time
+
+class LatestValue:
+    def __init__(self):
+        """slot holding the latest reading of a data source.
+        Writer replaces the whole tuple at once, so readers never need a lock.
+        """
+        self.reading:tuple = (None, None) # (value, monotonic time of reading)
+
+    def set(self, value):
+        """stores a new reading
+        Args:
+            value (any): measured value, None if error
+        """
+        self.reading = (value, time.monotonic())
+
+    def get(self):
+        """returns latest value
+        Returns:
+            any: latest measured value, None if not measured yet
+        """
+        return self.reading[0]
+
+    def get_age(self) -> float:
+        """returns age of latest value
+        Returns:
+            float: seconds since latest reading, None if not measured yet
+        """
+        timestamp = self.reading[1]
+        if timestamp is None:
+            return None
+        return time.monotonic() - timestamp
+
+class Sampler:
+    def __init__(self, name:str, fetch_function, slots:dict[str:LatestValue], interval:float, governor=None, on_reading=None):
+        """reads several data sources of one backend in one batch, in its own background thread on its own schedule
+        Args:
+            name (str): unique name of sampler (e.g. name of backend)
+            fetch_function (function): function with list of keys as parameter returning dict key -> value (may block)
+            slots (dict[str:LatestValue]): key -> slot the latest value is written into
+            interval (float): seconds between start of two readings
+            governor (PollingGovernor): adapts interval to the readings (None for fixed interval)
+            on_reading (function): function with dict key -> value as parameter, called after every reading (e.g. to store history)
+        """
+        self.name = name
+        self.fetch_function = fetch_function
+        self.slots = slots
+        self.interval = interval
+        self.governor = governor
+        self.on_reading = on_reading
+        self.stop_event = threading.Event()
+        self.thread:threading.Thread = None
+
+    def add_slot(self, key:str, slot:LatestValue):
+        """adds a data source while sampling (e.g. sensor found after startup)
+        Args:
+            key (str): key of data source
+            slot (LatestValue): slot the latest value is written into
+        """
+        self.slots = {**self.slots, key: slot} # replaced at once, running reading keeps old dict
+
+    def remove_slot(self, key:str):
+        """removes a data source while sampling (e.g. source removed from config)
+        Args:
+            key (str): key of data source
+        """
+        self.slots = {slot_key: slot for slot_key, slot in self.slots.items() if slot_key != key}
+
+    def run(self):
+        """reads values every interval until stopped
+        """
+        while not self.stop_event.is_set():
+            start = time.monotonic()
+            try:
+                values = self.fetch_function(list(self.slots))
+            except Exception as e:
+                print("Sampler", self.name, "error:", e)
+                values = {}
+            for key, slot in self.slots.items():
+                slot.set(values.get(key))
+            if self.on_reading is not None:
+                try:
+                    self.on_reading(values)
+                except Exception as e: # sampling goes on
+                    print("Sampler", self.name, "error:", e)
+            if self.governor is not None:
+                self.interval = self.governor.update(values) or self.interval # adapted to changes of readings
+            self.stop_event.wait(max(0, self.interval - (time.monotonic() - start))) # slow readings don't shift schedule
+
+    def start(self):
+        """starts sampling thread (does nothing if already started)
+        """
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.run, name="sampler-" + self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """stops sampling thread and waits until current reading is finished
+        """
+        self.stop_event.set()
+        if self.thread: # if thread is not None
+            self.thread.join()
@@ -1,9 +1,91 @@
-from sungrow_websocket import SungrowWebsocket
-from aiohttp import ClientConnectorError # to catch connection error
-from websockets import ConnectionClosedError, InvalidMessage
+import threading
+import time
+import random
+import collections
+import concurrent.futures
 
-class SolarData:
-    def __init__(self, ip_address:str, username:str, password:str, port:int, locale:str="en_US"):
+from data_sources.sungrow_session import SungrowSession, EventLoopThread
+from data_sources.registry import DataSourceBackend
+from monitoring import metrics
+
+class CircuitBreaker:
+    CLOSED = "closed" # inverter reachable, every request allowed
+    OPEN = "open" # inverter unreachable, no requests until backoff is over
+    HALF_OPEN = "half_open" # backoff over, one probe request allowed
+
+    def __init__(self, failure_threshold:int=3, base_backoff:float=2.0, max_backoff:float=300.0):
+        """connection health of the inverter with jittered exponential backoff
+        Args:
+            failure_threshold (int): failed requests in a row until breaker opens
+            base_backoff (float): seconds of first backoff
+            max_backoff (float): maximum seconds of backoff
+        """
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.state:str = self.CLOSED
+        self.failures:int = 0 # failed requests in a row
+        self.open_count:int = 0 # openings since last success (exponent of backoff)
+        self.open_until:float = 0 # monotonic time until breaker stays open
+        self.lock = threading.Lock() # requests come from sampler threads and asyncio loop
+
+    def allow_request(self) -> bool:
+        """returns if a request to the inverter may be sent now
+        Returns:
+            bool: True if closed or if this is the probe request after backoff
+        """
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() >= self.open_until:
+                self.state = self.HALF_OPEN # only this caller probes
+                return True
+            return False
+
+    def record_success(self):
+        """closes breaker after successful request
+        """
+        with self.lock:
+            if self.state != self.CLOSED:
+                print("Inverter reachable again")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.open_count = 0
+
+    def record_failure(self) -> bool:
+        """counts failed request, opens breaker after failure_threshold failures or a failed probe
+        Returns:
+            bool: True if breaker was opened by this failure
+        """
+        with self.lock:
+            self.failures += 1
+            if self.state == self.OPEN:
+                return False
+            if self.state == self.CLOSED and self.failures < self.failure_threshold:
+                return False
+            backoff = min(self.max_backoff, self.base_backoff * 2 ** self.open_count)
+            backoff *= random.uniform(0.5, 1.0) # jitter, so other clients of the dongle don't retry at the same time
+            self.state = self.OPEN
+            self.open_count += 1
+            self.open_until = time.monotonic() + backoff
+            print(f"Inverter unreachable, next try in {backoff:.0f} s")
+            return True
+
+    def get_status(self) -> dict[str:any]:
+        """returns state of breaker
+        Returns:
+            dict[str:any]: state, failures in a row and seconds until next try
+        """
+        with self.lock:
+            return {"state": self.state,
+                    "failures": self.failures,
+                    "retry_in": max(0, self.open_until - time.monotonic()) if self.state == self.OPEN else 0}
+
+class SolarData(DataSourceBackend):
+    name = "inverter"
+
+    def __init__(self, ip_address:str, username:str, password:str, port:int, locale:str="en_US", cache_ttl:float=1.0,
+                 loop_thread:EventLoopThread=None, max_stale_age:float=300.0, web_port:int=None):
         """
         Args:
             ip_address (str): IP-address of host (sungrow-inverter)
@@ -11,73 +93,291 @@ class SolarData:
             password(str): password to WiNet-S
             locale(str): language specifications
             port(int): port to WiNet-S
+            cache_ttl(float): seconds a fetched snapshot is served before the inverter is requested again
+            loop_thread(EventLoopThread): asyncio loop the inverter session runs on (own loop if None)
+            max_stale_age(float): seconds the last known values are served while inverter is unreachable
+            web_port(int): port of the web interface providing translations (None for 443 with wss, otherwise 80)
         """
+        super().__init__()
         self.ip_address = ip_address
         self.locale = locale
         self.port = port
         self.username = username
         self.password = password
-        try:
-            self.sungrow = SungrowWebsocket(self.ip_address, username=self.username, password=self.password, port=self.port, locale=self.locale) # inverter object
-        except Exception as e:
-            self.sungrow = None
+        self.cache_ttl = cache_ttl
+        self.sample_interval = cache_ttl # background readings are served from the snapshot
+        self.max_stale_age = max_stale_age
 
-    def reconnect(self):
-        """tries reconnecting to inverter once
+        self.snapshot:dict[str:any] = {} # all items of last successful fetch (kW already converted to W)
+        self.snapshot_time:float = None # monotonic time of last successful fetch, None if never fetched
+        self.snapshot_wall_time:float = None # Unix time of last successful fetch (for API clients)
+        self.units:dict[str:str] = {} # item key -> unit of last fetch (W instead of kW)
+        self.attempt_time:float = None # monotonic time of last fetch (successful or not)
+        self.last_fetch_failed:bool = False
+        self.cache_lock = threading.Lock() # protects snapshot and in-flight fetch
+        self.fetch_done:threading.Event = None # set when in-flight fetch is finished, None if no fetch running
+        self.listeners:list = [] # callbacks getting every pushed snapshot
+        self.breaker = CircuitBreaker() # no requests while inverter is unreachable
+        self.error_counts = collections.Counter() # error name -> number of occurrences
+        self.reported_missing_items:set = set() # unknown item names already printed once
+        self.last_error:str = None # description of last error
+
+        # one authenticated websocket is kept open and reconnects by itself
+        self.sungrow = SungrowSession(self.ip_address, self.username, self.password, port=self.port, locale=self.locale, loop_thread=loop_thread,
+                                      web_port=web_port)
+        self.sungrow.add_listener(self.on_session_snapshot)
+
+    def get_snapshot_age(self) -> float:
+        """returns age of the cached values
+        Returns:
+            float: seconds since last successful fetch, None if never fetched
         """
-        self.sungrow = SungrowWebsocket(self.ip_address, username=self.username, password=self.password, port=self.port, locale=self.locale)
+        if self.snapshot_time is None:
+            return None
+        return time.monotonic() - self.snapshot_time
 
+    def is_stale(self, key:str=None) -> bool:
+        """returns if served values are the last known ones instead of fresh ones
+        Args:
+            key (str): key of item (all items share one snapshot)
 
-    def get_data(self, item_name:str) -> float:
-        """requets data from inverter and returns its value
+        Returns:
+            bool: True if last fetch failed or inverter is marked unreachable
+        """
+        return self.last_fetch_failed or self.breaker.state != CircuitBreaker.CLOSED
+
+    def get_value_time(self, key:str=None) -> float:
+        """returns when the served values were fetched
         Args:
-            item_name (str): unique name of item to get data of it (key of requested item from SungrowWebsocket)
+            key (str): key of item (all items share one snapshot)
 
         Returns:
-            float: value of requested data (uses default unit of inverter, except of watts (kW instead of W))
+            float: Unix time of last successful fetch, None if never fetched
         """
+        return self.snapshot_wall_time
+
+    def get_current_snapshot(self) -> dict[str:any]:
+        """returns cached values without any request, empty if older than max_stale_age
+        Returns:
+            dict[str:any]: all items of inverter with their values
+        """
+        age = self.get_snapshot_age()
+        if age is None or age > self.max_stale_age:
+            return {}
+        return self.snapshot
+
+    def get_snapshot(self) -> dict[str:any]:
+        """returns all inverter items, fetches a new snapshot if last fetch is older than cache_ttl.
+        Concurrent callers share one in-flight fetch. While the inverter is unreachable the last known
+        values are returned immediately (see is_stale()).
+
+        Returns:
+            dict[str:any]: all items of inverter with their values (empty if no values known)
+        """
+        with self.cache_lock:
+            if self.attempt_time is not None and time.monotonic() - self.attempt_time < self.cache_ttl: # cached snapshot still valid
+                return self.get_current_snapshot()
+            fetch_done = self.fetch_done
+            if fetch_done is None: # no fetch running -> this caller fetches
+                if not self.breaker.allow_request(): # inverter unreachable, backoff not over
+                    return self.get_current_snapshot()
+                self.fetch_done = threading.Event()
+            elif self.breaker.state != CircuitBreaker.CLOSED: # don't wait for a probe request
+                return self.get_current_snapshot()
+
+        if fetch_done is not None: # other caller is already fetching
+            fetch_done.wait()
+            return self.get_current_snapshot()
+
+        snapshot = None
         try:
-            if not self.sungrow:
-                self.reconnect()
+            snapshot = self.fetch_snapshot()
+        finally:
+            with self.cache_lock:
+                self.attempt_time = time.monotonic() # failed fetches are cached too, so offline inverter isn't requested by every caller
+                if snapshot is not None:
+                    self.snapshot = snapshot
+                    self.snapshot_time = self.attempt_time
+                    self.snapshot_wall_time = time.time()
+                fetch_done = self.fetch_done
+                self.fetch_done = None
+            fetch_done.set() # wake up waiting callers
+        return self.get_current_snapshot()
 
-            data = self.sungrow.get_data()
-            value = data[item_name].value
-            if data[item_name].unit == "kW":
-                value = float(value) * 1000 # unit kW -> W
-            return value
-        except ClientConnectorError as e: # no connection to inverter
-            print("ClientConnectionError:", e)
-            self.sungrow = None
-            return None
-        except KeyError as e:
-            print("KeyError: Key", e, "is no item of inverter")
-            self.sungrow = None
-            return None
-        except ConnectionClosedError as e:
-            print("ConnectionClosedError:", e, "- please check if another device is currently accessing inverter host")
-            self.sungrow = None
-            return None
-        except InvalidMessage as e:
-            print("InvalidMessageError:", e, "- please check if another device is currently accessing inverter host")
-            self.sungrow = None
-            return None
-        except TimeoutError as e:
-            print("TimeoutError:", e)
-            self.sungrow = None
-            return None
-        except OSError as e:
-            if e.errno == 113:
-                print("Host unreachable:", self.ip_address, ", check network connection")
-                self.sungrow = None
-                return None
-            else:
-                print("OSError with Code", e.errno, ":", e)
-                self.sungrow = None
-                return None
+    def fetch_snapshot(self) -> dict[str:any]:
+        """requests all items from inverter once over the persistent session
+        Returns:
+            dict[str:any]: all items with their values (uses default unit of inverter, except of watts (W instead of kW)), None if error
+        """
+        try:
+            snapshot = self.convert_snapshot(self.sungrow.fetch_snapshot())
         except Exception as e:
-            print("Unknown Error:", e)
-            self.sungrow = None
+            self.record_error(e)
+            return None
+        self.record_success()
+        return snapshot
+
+    def get_error_name(self, error:Exception) -> str:
+        """returns name under which error is counted
+        Args:
+            error (Exception): error of a request
+
+        Returns:
+            str: name of error (e.g. "ClientConnectorError", "HostUnreachable", "SungrowProtocolError")
+        """
+        if isinstance(error, OSError) and error.errno == 113:
+            return "HostUnreachable"
+        if isinstance(error, concurrent.futures.TimeoutError):
+            return "TimeoutError"
+        return type(error).__name__
+
+    def record_error(self, error:Exception):
+        """counts failed request and updates connection health
+        Args:
+            error (Exception): error of the request
+        """
+        self.error_counts[self.get_error_name(error)] += 1
+        metrics.increment("errors.inverter." + self.get_error_name(error))
+        self.last_error = f"{self.get_error_name(error)}: {error}"
+        self.last_fetch_failed = True
+        self.breaker.record_failure()
+
+    def record_success(self):
+        """marks inverter as reachable
+        """
+        self.last_fetch_failed = False
+        self.breaker.record_success()
+
+    def convert_snapshot(self, raw_snapshot:dict[str:dict[str:str]]) -> dict[str:any]:
+        """converts raw items of the session to values
+        Args:
+            raw_snapshot (dict[str:dict[str:str]]): item key -> {"value": value, "unit": unit}
+
+        Returns:
+            dict[str:any]: item key -> value (kW converted to W)
+        """
+        snapshot = {}
+        units = {}
+        for item_name, item in raw_snapshot.items():
+            value = item["value"]
+            units[item_name] = item["unit"]
+            if item["unit"] == "kW":
+                value = float(value) * 1000 # unit kW -> W
+                units[item_name] = "W"
+            snapshot[item_name] = value
+        self.units = units # replaced at once
+        return snapshot
+
+    def on_session_snapshot(self, raw_snapshot:dict[str:dict[str:str]]):
+        """stores snapshot pushed by the session and forwards it to listeners
+        Args:
+            raw_snapshot (dict[str:dict[str:str]]): item key -> {"value": value, "unit": unit}
+        """
+        snapshot = self.convert_snapshot(raw_snapshot)
+        with self.cache_lock:
+            self.snapshot = snapshot
+            self.snapshot_time = time.monotonic()
+            self.snapshot_wall_time = time.time()
+            self.attempt_time = self.snapshot_time
+        self.record_success()
+        for callback in self.listeners:
+            try:
+                callback(snapshot)
+            except Exception as e: # a bug of a listener (e.g. display) must not count as failure of the inverter
+                metrics.increment("errors.listener." + type(e).__name__)
+                print("Listener error:", type(e).__name__, e)
+
+    def add_listener(self, callback):
+        """registers callback which gets every fresh snapshot pushed by the session (must not block)
+        Args:
+            callback (function): function with snapshot (dict[str:any]) as parameter
+        """
+        self.listeners.append(callback)
+
+    def start_polling(self):
+        """lets the session push a fresh snapshot every cache_ttl seconds (paused while inverter is unreachable)
+        """
+        self.sungrow.start_polling(self.cache_ttl, allow_poll=self.breaker.allow_request, on_error=self.record_error)
+
+    def set_poll_interval(self, interval:float):
+        """polls inverter and serves snapshots for interval seconds (e.g. longer at night)
+        Args:
+            interval (float): seconds between two inverter requests
+        """
+        self.cache_ttl = interval
+        self.sungrow.set_poll_interval(interval)
+
+    def get_stats(self) -> dict[str:float]:
+        """returns connection statistics of the session and connection health
+        Returns:
+            dict[str:float]: open connections, reconnects, request latencies, breaker state and error counts
+        """
+        stats = self.sungrow.get_stats()
+        stats["breaker"] = self.breaker.get_status()
+        stats["errors"] = dict(self.error_counts)
+        stats["stale"] = self.is_stale()
+        stats["snapshot_age"] = self.get_snapshot_age()
+        return stats
+
+    def get_many(self, items:list[str]) -> dict[str:float]:
+        """returns values of several items from one snapshot
+        Args:
+            items (list[str]): unique names of items (keys of inverter items)
+
+        Returns:
+            dict[str:float]: value of each requested item, None if not available
+        """
+        snapshot = self.get_snapshot()
+        values = {}
+        for item_name in items:
+            if snapshot and item_name not in snapshot:
+                self.error_counts["UnknownItem"] += 1
+                if item_name not in self.reported_missing_items: # print only once
+                    self.reported_missing_items.add(item_name)
+                    print("KeyError: Key", item_name, "is no item of inverter")
+            values[item_name] = snapshot.get(item_name)
+        return values
+
+    def get_keys(self) -> list[str]:
+        """returns keys of all inverter items of the current snapshot
+        Returns:
+            list[str]: keys of inverter items
+        """
+        return list(self.get_current_snapshot().keys())
+
+    def fetch(self, keys:list[str]) -> dict[str:any]:
+        """returns several inverter items from one snapshot
+        Args:
+            keys (list[str]): keys of inverter items
+
+        Returns:
+            dict[str:any]: value of each item, None if not available
+        """
+        return self.get_many(keys)
+
+    def get_startup_stages(self) -> list[tuple]:
+        """returns first inverter request as startup stage, afterwards the session pushes fresh snapshots every cache_ttl
+        Returns:
+            list[tuple]: (stage name, function returning None for all keys)
+        """
+        def connect_inverter():
+            self.get_snapshot()
+            self.start_polling()
             return None
 
+        return [("inverter_connection", connect_inverter)]
+
+    def get_data(self, item_name:str) -> float:
+        """returns value of an item from cached snapshot
+        Args:
+            item_name (str): unique name of item to get data of it (key of inverter item)
+
+        Returns:
+            float: value of requested data (uses default unit of inverter, except of watts (W instead of kW)), None if error
+        """
+        return self.get_many([item_name])[item_name]
 
-        
+    def close(self):
+        """closes the inverter session
+        """
+        self.sungrow.close()
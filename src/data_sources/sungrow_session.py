@@ -0,0 +1,411 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+import collections
+
+import aiohttp
+
+from monitoring import metrics
+
+TOKEN_EXPIRED_CODE = 106 # result_code of WiNet-S if token is no longer valid
+
+class SungrowProtocolError(Exception):
+    """WiNet-S answered with an unsuccessful result_code
+    """
+    def __init__(self, service:str, result_code:int, result_msg:str):
+        super().__init__(f"service '{service}' failed with code {result_code}: {result_msg}")
+        self.service = service
+        self.result_code = result_code
+        self.result_msg = result_msg
+
+class EventLoopThread:
+    def __init__(self, name:str="asyncio-loop"):
+        """runs one asyncio event loop in a background thread
+        Args:
+            name (str): name of the thread
+        """
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        """schedules coroutine on the loop without waiting
+        Args:
+            coro (coroutine): coroutine to run on the loop
+
+        Returns:
+            concurrent.futures.Future: future of the coroutine result
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout:float=None):
+        """runs coroutine on the loop and waits for its result
+        Args:
+            coro (coroutine): coroutine to run on the loop
+            timeout (float): seconds to wait for the result (None for no limit)
+
+        Returns:
+            any: result of the coroutine
+        """
+        return self.submit(coro).result(timeout)
+
+    def stop(self):
+        """stops the loop and waits for the thread
+        """
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+class SungrowSession:
+    def __init__(self, host:str, username:str, password:str, port:int=443, locale:str="en_US",
+                 loop_thread:EventLoopThread=None, request_timeout:float=10.0, keepalive_interval:float=20.0, web_port:int=None):
+        """keeps one authenticated websocket to the WiNet-S dongle open
+        Args:
+            host (str): IP-address of host (sungrow-inverter)
+            username (str): username to WiNet-S
+            password (str): password to WiNet-S
+            port (int): port to WiNet-S (443 uses wss)
+            locale (str): language specifications
+            loop_thread (EventLoopThread): loop to run the session on (own loop if None)
+            request_timeout (float): seconds to wait for an answer of the dongle
+            keepalive_interval (float): seconds without request after which a keepalive request is sent
+            web_port (int): port of the web interface providing translations (None for 443 with wss, otherwise 80)
+        """
+        self.host = host
+        self.username = username
+        self.password = password
+        self.port = port
+        self.locale = locale
+        self.request_timeout = request_timeout
+        self.keepalive_interval = keepalive_interval
+        self.web_port = web_port if web_port is not None else (443 if port == 443 else 80)
+        self.loop_thread = loop_thread or EventLoopThread("sungrow-session")
+
+        self.http_session:aiohttp.ClientSession = None
+        self.websocket:aiohttp.ClientWebSocketResponse = None
+        self.token:str = None # token of current login
+        self.dev_id:str = None # id of inverter device
+        self.request_lock:asyncio.Lock = None # only one request at a time on the websocket (created on loop)
+        self.fetch_task:asyncio.Task = None # in-flight snapshot fetch shared by concurrent callers
+        self.poll_task:asyncio.Task = None # pushes snapshots to listeners periodically
+        self.poll_interval:float = None # seconds between two polls (None if not polling)
+        self.poll_wakeup:asyncio.Event = None # set to end the current pause of the poll task (created on loop)
+        self.keepalive_task:asyncio.Task = None
+        self.last_request_time:float = 0 # monotonic time of last request
+        self.listeners:list = [] # callbacks getting every fresh snapshot
+        self.strings:dict[str:str] = {} # i18n key -> text of locale (e.g. "I18N_COMMON_RUN" -> "Run"), loaded once
+        self.direct_supported:bool = True # False if dongle has no "direct" service (MPPT voltages and currents)
+        self.strings_error_reported:bool = False # failed loading of translations is printed once, not at every reconnect
+
+        # statistics to compare with connecting for every request
+        self.connections_opened:int = 0 # websockets opened in total
+        self.reconnects:int = 0 # connections lost and opened again
+        self.reauthentications:int = 0 # logins on open websocket after token expired
+        self.requests:int = 0 # snapshot requests in total
+        self.failed_requests:int = 0 # snapshot requests with error
+        self.latencies = collections.deque(maxlen=100) # seconds of the last snapshot requests
+
+    @property
+    def url(self) -> str:
+        scheme = "wss" if self.port == 443 else "ws"
+        return f"{scheme}://{self.host}:{self.port}/ws/home/overview"
+
+    def get_strings_url(self, locale:str) -> str:
+        scheme = "https" if self.web_port == 443 else "http"
+        return f"{scheme}://{self.host}:{self.web_port}/i18n/{locale}.properties"
+
+    def add_listener(self, callback):
+        """registers callback which gets every fresh snapshot (called on the loop thread, must not block)
+        Args:
+            callback (function): function with snapshot (dict[str:dict[str:str]]) as parameter
+        """
+        self.listeners.append(callback)
+
+    async def connect(self):
+        """opens websocket and logs in
+        """
+        if self.http_session is None:
+            self.http_session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.request_timeout))
+        self.websocket = await self.http_session.ws_connect(self.url, ssl=False) # WiNet-S uses self-signed certificate
+        self.connections_opened += 1
+        await self.login()
+        if not self.strings:
+            await self.load_strings()
+        self.start_keepalive()
+
+    async def load_strings(self):
+        """loads translations of the web interface (en_US if locale isn't available), items stay untranslated if they can't be loaded
+        """
+        for locale in dict.fromkeys((self.locale, "en_US")): # each locale once
+            try:
+                async with self.http_session.get(self.get_strings_url(locale), ssl=False) as response:
+                    if response.status != 200:
+                        continue
+                    text = await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e: # tried again at next connect
+                metrics.increment("errors.inverter.i18n")
+                if not self.strings_error_reported:
+                    self.strings_error_reported = True
+                    print("Inverter translations not loaded:", type(e).__name__, e)
+                return
+            for line in text.splitlines():
+                key, separator, value = line.partition("=")
+                if separator:
+                    self.strings[key] = value
+            return
+
+    async def login(self):
+        """gets token (and device id) on the open websocket
+        """
+        result = await self.send("connect", {"token": ""})
+        self.token = result["token"]
+        if self.username:
+            result = await self.send("login", {"username": self.username, "passwd": self.password})
+            self.token = result["token"]
+        result = await self.send("devicelist", {"type": "0", "is_check_token": "0"})
+        self.dev_id = str(result["list"][0]["dev_id"])
+
+    async def close_websocket(self):
+        """closes websocket, next request connects again
+        """
+        if self.websocket is not None:
+            await self.websocket.close()
+        self.websocket = None
+        self.token = None
+
+    async def send(self, service:str, payload:dict[str:str]=None) -> dict[str:any]:
+        """sends one request and waits for its answer
+        Args:
+            service (str): WiNet-S service name
+            payload (dict[str:str]): additional request fields
+
+        Returns:
+            dict[str:any]: result_data of answer
+        """
+        request = {"lang": self.locale, "token": self.token, "service": service}
+        request.update(payload or {})
+        await self.websocket.send_json(request)
+        self.last_request_time = time.monotonic()
+        message = await self.websocket.receive(timeout=self.request_timeout)
+        if message.type != aiohttp.WSMsgType.TEXT: # closed or error
+            raise ConnectionResetError(f"websocket closed by inverter ({message.type.name})")
+        answer = message.json()
+        if answer["result_code"] != 1:
+            raise SungrowProtocolError(service, answer["result_code"], answer.get("result_msg", ""))
+        return answer["result_data"]
+
+    async def request(self, service:str, payload:dict[str:str]=None) -> dict[str:any]:
+        """sends request on authenticated websocket, logs in again once if token expired
+        Args:
+            service (str): WiNet-S service name
+            payload (dict[str:str]): additional request fields
+
+        Returns:
+            dict[str:any]: result_data of answer
+        """
+        if self.websocket is None or self.websocket.closed:
+            if self.connections_opened > 0:
+                self.reconnects += 1
+                metrics.increment("inverter.reconnects")
+            await self.connect()
+        try:
+            return await self.send(service, payload)
+        except SungrowProtocolError as e:
+            if e.result_code != TOKEN_EXPIRED_CODE:
+                raise
+            self.reauthentications += 1
+            metrics.increment("inverter.reauthentications")
+            await self.login() # re-authenticate in place, websocket stays open
+            return await self.send(service, payload)
+
+    def get_item_key(self, name:str) -> str:
+        """returns key of a real time item
+        Args:
+            name (str): data_name of item (e.g. "I18N_COMMON_TOTAL_DCPOWER")
+
+        Returns:
+            str: key of item (e.g. "total_dcpower")
+        """
+        if name.startswith("I18N_COMMON_"):
+            return name.removeprefix("I18N_COMMON_").lower()
+        return name.removeprefix("I18N_").lower()
+
+    def get_direct_items(self, item:dict[str:str]) -> dict[str:dict[str:str]]:
+        """returns voltage and current of one MPPT (or string) of the "direct" service
+        Args:
+            item (dict[str:str]): entry of "direct" list (e.g. "name": "I18N_COMMON_MPPT_NUM%@1", "voltage", "current" and their units)
+
+        Returns:
+            dict[str:dict[str:str]]: e.g. "mppt1_voltage" and "mppt1_current" -> {"value": value, "unit": unit}
+        """
+        name = item["name"]
+        if name.startswith("I18N_COMMON_"): # numbered text (e.g. "MPPT{0}") with number at end of name
+            name = self.strings.get(name[:-3], name[:-3].removeprefix("I18N_COMMON_") + "{0}").format(name[-1])
+        key = name.lower().replace(" ", "_")
+        return {key + "_voltage": {"value": item["voltage"], "unit": item["voltage_unit"]},
+                key + "_current": {"value": item["current"], "unit": item["current_unit"]}}
+
+    async def read_snapshot(self) -> dict[str:dict[str:str]]:
+        """requests all real time items of inverter and battery, and voltage and current of each MPPT
+        Returns:
+            dict[str:dict[str:str]]: item key -> {"value": value, "unit": unit}, values like states are translated (e.g. "Run")
+        """
+        snapshot = {}
+        async with self.request_lock:
+            payload = {"dev_id": self.dev_id or "", "time123456": int(time.time())}
+            for service in ("real", "real_battery"):
+                result = await self.request(service, payload)
+                for item in result["list"]:
+                    snapshot[self.get_item_key(item["data_name"])] = {"value": self.strings.get(item["data_value"], item["data_value"]),
+                                                                       "unit": item["data_unit"]}
+            if self.direct_supported:
+                try:
+                    result = await self.request("direct", payload)
+                except SungrowProtocolError as e: # e.g. older firmware, real time items are served anyway
+                    self.direct_supported = False
+                    print("Inverter has no MPPT items:", e)
+                else:
+                    for item in result["list"]:
+                        snapshot.update(self.get_direct_items(item))
+        return snapshot
+
+    async def fetch_snapshot_async(self) -> dict[str:dict[str:str]]:
+        """fetches snapshot, concurrent callers share one in-flight fetch
+        Returns:
+            dict[str:dict[str:str]]: item key -> {"value": value, "unit": unit}
+        """
+        if self.request_lock is None:
+            self.request_lock = asyncio.Lock()
+        if self.fetch_task is None:
+            self.fetch_task = asyncio.create_task(self.timed_fetch())
+            self.fetch_task.add_done_callback(self.clear_fetch_task)
+        return await asyncio.shield(self.fetch_task)
+
+    def clear_fetch_task(self, task:asyncio.Task):
+        self.fetch_task = None
+        if not task.cancelled():
+            task.exception() # marks error as retrieved, callers awaiting the shielded task get it anyway (no warning if all were cancelled)
+
+    async def timed_fetch(self) -> dict[str:dict[str:str]]:
+        """fetches snapshot, counts latency and pushes result to listeners
+        """
+        start = time.monotonic()
+        self.requests += 1
+        try:
+            snapshot = await self.read_snapshot()
+        except Exception:
+            self.failed_requests += 1
+            await self.close_websocket() # connection state unknown, reconnect on next request
+            raise
+        self.latencies.append(time.monotonic() - start)
+        metrics.observe("inverter.request", self.latencies[-1])
+        for callback in self.listeners:
+            try:
+                callback(snapshot)
+            except Exception as e: # a bug of a listener (e.g. display) must not count as failure of the inverter
+                metrics.increment("errors.listener." + type(e).__name__)
+                print("Listener error:", type(e).__name__, e)
+        return snapshot
+
+    def fetch_snapshot(self) -> dict[str:dict[str:str]]:
+        """fetches snapshot from any thread
+        Returns:
+            dict[str:dict[str:str]]: item key -> {"value": value, "unit": unit}
+        """
+        return self.loop_thread.run(self.fetch_snapshot_async(), timeout=3 * self.request_timeout)
+
+    def start_keepalive(self):
+        if self.keepalive_task is None or self.keepalive_task.done():
+            self.keepalive_task = asyncio.get_running_loop().create_task(self.keepalive())
+
+    async def keepalive(self):
+        """sends a cheap request if websocket was idle for keepalive_interval
+        """
+        while self.websocket is not None and not self.websocket.closed:
+            idle = time.monotonic() - self.last_request_time
+            if idle < self.keepalive_interval:
+                await asyncio.sleep(self.keepalive_interval - idle)
+                continue
+            if self.poll_interval is not None and self.poll_interval > 3 * self.keepalive_interval:
+                await self.close_websocket() # polls are rare (e.g. at night), reconnecting is cheaper than keepalive requests
+                return
+            try:
+                async with self.request_lock:
+                    await self.request("devicelist", {"type": "0", "is_check_token": "0"})
+            except Exception:
+                await self.close_websocket()
+
+    def start_polling(self, interval:float, allow_poll=None, on_error=None):
+        """fetches snapshots every interval seconds and pushes them to listeners
+        Args:
+            interval (float): seconds between two fetches (changeable with set_poll_interval())
+            allow_poll (function): function without parameters returning if a fetch may be sent now (None for always)
+            on_error (function): function with exception as parameter, called for failed fetches
+        """
+        self.poll_interval = interval
+
+        async def poll():
+            while True:
+                start = time.monotonic()
+                if allow_poll is None or allow_poll():
+                    try:
+                        await self.fetch_snapshot_async()
+                    except Exception as e: # counted in failed_requests, next poll reconnects
+                        if on_error is not None:
+                            on_error(e)
+                while True: # pause is recomputed when interval changes meanwhile
+                    remaining = self.poll_interval - (time.monotonic() - start)
+                    if remaining <= 0:
+                        break
+                    self.poll_wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self.poll_wakeup.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+
+        async def create_poll_task():
+            if self.poll_task is None:
+                self.poll_wakeup = asyncio.Event()
+                self.poll_task = asyncio.create_task(poll())
+
+        self.loop_thread.run(create_poll_task())
+
+    def set_poll_interval(self, interval:float):
+        """changes seconds between two polls, a shorter interval shortens the current pause
+        Args:
+            interval (float): seconds between two fetches
+        """
+        shorter = self.poll_interval is None or interval < self.poll_interval
+        self.poll_interval = interval
+        if shorter and self.poll_wakeup is not None:
+            self.loop_thread.loop.call_soon_threadsafe(self.poll_wakeup.set)
+
+    def get_stats(self) -> dict[str:float]:
+        """returns connection statistics
+        Returns:
+            dict[str:float]: counters and latencies (seconds) of the session
+        """
+        latencies = list(self.latencies)
+        return {"connections_opened": self.connections_opened,
+                "reconnects": self.reconnects,
+                "reauthentications": self.reauthentications,
+                "requests": self.requests,
+                "failed_requests": self.failed_requests,
+                "last_latency": latencies[-1] if latencies else None,
+                "avg_latency": sum(latencies) / len(latencies) if latencies else None,
+                "max_latency": max(latencies) if latencies else None}
+
+    def close(self):
+        """closes websocket and http session
+        """
+        async def close_all():
+            tasks = [task for task in (self.poll_task, self.keepalive_task) if task is not None]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True) # finished before the loop may be stopped
+            await self.close_websocket()
+            if self.http_session is not None:
+                await self.http_session.close()
+                self.http_session = None
+
+        self.loop_thread.run(close_all())
@@ -1,94 +1,315 @@
 import os
 import glob
-import Adafruit_DHT
+import time
+import threading
+import subprocess
 
-class TemperatureAndHumidity:
-    def __init__(self):
-        # load 1-wire modules
-        os.system("modprobe w1-gpio")
-        os.system("modprobe w1-therm")
+try:
+    import Adafruit_DHT
+except (ImportError, RuntimeError): # not on a Raspberry Pi, DHT11 needs a scripted sensor (see emulation)
+    Adafruit_DHT = None
 
-        base_dir = "/sys/bus/w1/devices/"
-        device_folder = glob.glob(base_dir + "28*") # search for DS18B20 device
+from data_sources.registry import DataSourceBackend
+from data_sources.sampler import LatestValue, Sampler
+from monitoring import metrics
 
-        # check if DS18B20 connected
-        self.ds18_connected = False # DS18B20 connected
-        if device_folder:
-            self.device_file = device_folder[0] + "/w1_slave" # use first device (if multiple DS18B20 connected)
-            raw_ds18 = self.read_raw_ds18()
-            self.ds18_connected = self.is_valid_ds18(raw_ds18) # checks if sensor dekivers valid values
+PROBE_PREFIX = "ds18b20_" # data source key of a DS18B20 is PROBE_PREFIX + serial number (e.g. "ds18b20_0000075a1b2c")
 
+class TemperatureAndHumidity(DataSourceBackend):
+    name = "climate"
+    sample_interval = 5 # seconds between two background readings (DHT11 blocks several seconds)
 
-        self.sensor_dht11 = Adafruit_DHT.DHT11
+    def __init__(self, base_dir:str="/sys/bus/w1/devices/", dht=None, primary_probe:str=None, rescan_interval:float=30):
+        """sensors are not probed here, call detect_ds18() and detect_dht11() (may run concurrently in background).
+        Every DS18B20 is read by its own thread, so one slow probe never delays the others.
+        Args:
+            base_dir (str): 1-wire device folder (e.g. fake tree of emulation.FakeW1Tree)
+            dht (module): DHT library with DHT11 and read_retry(), None for Adafruit_DHT (e.g. emulation.ScriptedDHT)
+            primary_probe (str): serial number of DS18B20 used for "temperature" (None for first valid probe)
+            rescan_interval (float): seconds between two searches for plugged in or removed DS18B20
+        """
+        super().__init__()
+        self.base_dir = base_dir
+        self.ds18_connected = False # at least one DS18B20 connected
+        self.dht = dht or Adafruit_DHT
+        self.sensor_dht11 = self.dht.DHT11 if self.dht else None
         self.pin = 17
-
-        # check if DHT11 connected
         self.dht11_connected = False
-        humidity, temperature = Adafruit_DHT.read_retry(self.sensor_dht11, self.pin)
-        if humidity or temperature: # if one of both values id valid
-            self.dht11_connected = True
-    
-    def read_raw_ds18(self) -> list[str]:
-        """returns array of lines from the DS18B20 file
-        Returns:
-            list[str]: array of lines from file
+        self.detection_retries = 3 # reads of DHT11 at detection (library default takes up to 30 seconds without sensor)
+
+        self.primary_probe = primary_probe
+        self.rescan_interval = rescan_interval
+        self.probe_readers:dict[str:Sampler] = {} # key -> reader thread of connected DS18B20
+        self.probe_slots:dict[str:LatestValue] = {} # key -> cached reading of every DS18B20 ever found
+        self.probes_lock = threading.Lock() # protects probe_readers and probe_slots
+        self.probe_interval:float = self.sample_interval # seconds between two readings of each DS18B20
+        self.rescan_stop_event = threading.Event()
+        self.rescan_thread:threading.Thread = None
+
+    def load_w1_modules(self):
+        """loads 1-wire modules with one modprobe call, skipped if already loaded
         """
+        if os.path.isdir(self.base_dir): # modules already loaded
+            return
         try:
-            with open(self.device_file, "r") as d_file:
-                lines = d_file.readlines()
-            return lines
+            subprocess.run(["modprobe", "-a", "w1-gpio", "w1-therm"], check=False, capture_output=True)
         except FileNotFoundError as e:
             print("FileNotFoundError:", e)
-            return[". crc=00", ". t=0"]
-    
-    def is_valid_ds18(self, lines) -> bool:
-        """returns if ds18 returns valid values
+
+    def scan_probes(self) -> list[str]:
+        """starts reader threads of new DS18B20 and stops readers of removed ones
+        Returns:
+            list[str]: keys of DS18B20 never found before
+        """
+        found = {PROBE_PREFIX + os.path.basename(folder)[3:]: os.path.join(folder, "w1_slave")
+                 for folder in glob.glob(os.path.join(self.base_dir, "28-*"))} # key -> device file
+        new_keys = []
+        removed_readers = []
+        with self.probes_lock:
+            for key in list(self.probe_readers):
+                if key not in found: # unplugged
+                    removed_readers.append(self.probe_readers.pop(key))
+                    self.probe_slots[key].set(None)
+            for key in sorted(found):
+                if key in self.probe_readers:
+                    continue
+                if key not in self.probe_slots:
+                    self.probe_slots[key] = LatestValue()
+                    new_keys.append(key)
+                reader = Sampler(key, lambda keys, device_file=found[key]: {keys[0]: self.read_probe(device_file)},
+                                 {key: self.probe_slots[key]}, self.probe_interval)
+                self.probe_readers[key] = reader
+                reader.start()
+        for reader in removed_readers:
+            reader.stop() # waits for current conversion
+        return new_keys
+
+    def read_probe(self, device_file:str) -> float:
+        """reads one DS18B20 (blocks during its conversion of about 750 ms)
+        Args:
+            device_file (str): w1_slave file of sensor
+
+        Returns:
+            float: temperature accurate to 1 decimal place, None if sensor not readable or reading invalid
+        """
+        try:
+            with metrics.timer("ds18.read"):
+                with open(device_file, "rb") as d_file:
+                    raw = d_file.read()
+        except OSError as e:
+            metrics.increment("errors.ds18." + type(e).__name__)
+            return None
+        value = self.parse_ds18(raw)
+        if value is None:
+            metrics.increment("errors.ds18.InvalidReading")
+        return value
+
+    def parse_ds18(self, raw:bytes) -> float:
+        """parses content of w1_slave without splitting it into lines:
+        "72 01 4b 46 7f ff 0e 10 57 : crc=57 YES\n72 01 4b 46 7f ff 0e 10 57 t=23125\n"
         Args:
-            lines (list[str]): DS18B20 file as array
-        
+            raw (bytes): content of w1_slave
+
+        Returns:
+            float: temperature accurate to 1 decimal place, None if CRC check failed or sensor disconnected (crc and temperature zero)
+        """
+        line_end = raw.find(b"\n")
+        if line_end < 3 or raw[line_end - 3:line_end] != b"YES": # incomplete or CRC check failed
+            return None
+        position = raw.find(b"t=", line_end)
+        if position < 0:
+            return None
+        try:
+            millidegrees = int(raw[position + 2:]) # int() ignores trailing newline
+        except ValueError:
+            return None
+        if millidegrees == 0 and b"crc=00" in raw[:line_end]: # disconnected sensor delivers only zeros
+            return None
+        return round(millidegrees / 1000, 1)
+
+    def detect_ds18(self, timeout:float=2.0) -> list[str]:
+        """searches all DS18B20, starts their readers and waits for their first readings (all probes convert concurrently)
+        Args:
+            timeout (float): maximum seconds to wait for first readings
+
+        Returns:
+            list[str]: keys of all found DS18B20
+        """
+        self.load_w1_modules()
+        keys = self.scan_probes()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and any(self.probe_slots[key].get_age() is None for key in keys):
+            time.sleep(0.05)
+        self.ds18_connected = any(self.probe_slots[key].get() is not None for key in keys) # checks if sensors deliver valid values
+        self.start_rescanning()
+        return keys
+
+    def start_rescanning(self):
+        """starts background search for plugged in or removed DS18B20 (does nothing if already started)
+        """
+        if self.rescan_thread is not None:
+            return
+        self.rescan_thread = threading.Thread(target=self.rescan, name="ds18-rescan", daemon=True)
+        self.rescan_thread.start()
+
+    def rescan(self):
+        while not self.rescan_stop_event.wait(self.rescan_interval):
+            new_keys = self.scan_probes()
+            if new_keys:
+                print("DS18B20 found:", ", ".join(new_keys))
+                self.notify_new_keys(new_keys)
+
+    def detect_dht11(self) -> bool:
+        """checks if DHT11 is connected
         Returns:
-            bool: if DS18B20 returns valid values
+            bool: if DHT11 connected
         """
-        if (int(lines[0].strip().split("crc=")[-1][:2], 16) == 0) and (int(lines[1].strip().split("t=")[-1]) == 0): # if crc and temperature are both zero
+        if self.dht is None: # library not available
             return False
-        return True
+        humidity, temperature = self.dht.read_retry(self.sensor_dht11, self.pin, retries=self.detection_retries, delay_seconds=1)
+        if humidity or temperature: # if one of both values id valid
+            self.dht11_connected = True
+        return self.dht11_connected
     
-    def get_temperature(self):
-        """measures current temperature from preferred DS18B20-sensor and secondly from DHT11-sensor.
-        Sensors that weren't connected at program start are no longer checked for connection.
+    def get_keys(self) -> list[str]:
+        """returns keys of the data sources this backend provides
+        Returns:
+            list[str]: keys (equal to data_sources_info keys), one per DS18B20 found
+        """
+        with self.probes_lock:
+            return ["temperature", "humidity"] + sorted(self.probe_slots)
+
+    def provides(self, key:str) -> bool:
+        """returns if key belongs to this backend (also DS18B20 not plugged in yet)
+        Args:
+            key (str): key of data source
+
+        Returns:
+            bool: if backend provides key
+        """
+        return key in ("temperature", "humidity") or key.startswith(PROBE_PREFIX)
+
+    def get_source_info(self, key:str) -> dict[str:any]:
+        """returns data_sources_info entry for a DS18B20 which isn't configured (read for the API, only shown on the displays when configured)
+        Args:
+            key (str): key of data source
+
+        Returns:
+            dict[str:any]: name, alias_and_unit, duration and "rotation": False, None for temperature and humidity (only read when configured)
+        """
+        if not key.startswith(PROBE_PREFIX):
+            return None
+        return {"name": "Sensor " + key.removeprefix(PROBE_PREFIX)[-4:], "alias_and_unit": "T C", "duration": 5, "rotation": False}
+
+    def get_startup_stages(self) -> list[tuple]:
+        """returns detection steps run in background at startup
+        Returns:
+            list[tuple]: (stage name, function returning detected keys)
+        """
+        def detect_ds18() -> list[str]:
+            keys = self.detect_ds18()
+            return ["temperature"] + keys if self.ds18_connected else keys
+
+        def detect_dht11() -> list[str]:
+            self.detect_dht11()
+            return ["temperature", "humidity"] # shown even without sensor (no data)
+
+        return [("ds18_detection", detect_ds18), ("dht11_detection", detect_dht11)]
+
+    def fetch(self, keys:list[str]) -> dict[str:any]:
+        """measures requested values, one DHT11 reading fills temperature and humidity.
+        DS18B20 values come from the cache of their reader threads without waiting for a conversion.
+        Temperature comes from preferred DS18B20-sensor and secondly from DHT11-sensor.
+        A DHT11 that wasn't connected at program start is no longer checked for connection.
         Reason for this is too bad running time if every update the program checks for cinnected sensors.
-        However, sensors that have brief interruptions during the course of the program are checked for
-        connection each time.
+        DS18B20 plugged in later are found by the background rescan.
+
+        Args:
+            keys (list[str]): "temperature", "humidity" and/or DS18B20 keys
+
+        Returns:
+            dict[str:any]: temperature (DS18B20 accurate to 1 decimal place, DHT11 int) and humidity (int), None if not available
+        """
+        values = dict.fromkeys(keys)
+        for key in keys:
+            if key.startswith(PROBE_PREFIX):
+                values[key] = self.get_probe_value(key)
+        need_dht11 = "humidity" in keys
+        if "temperature" in keys:
+            values["temperature"] = self.read_ds18_temperature()
+            if values["temperature"] is None:
+                need_dht11 = True
+
+        if need_dht11 and self.dht11_connected: # checks whether it has been connected once from init
+            humidity, temperature = self.dht.read_retry(self.sensor_dht11, self.pin, retries=3, delay_seconds=1) # gets current data from sensor
+            if "temperature" in keys and values["temperature"] is None and temperature is not None:
+                values["temperature"] = int(temperature) # sensor is not able to measure decimal places
+            if "humidity" in keys and humidity is not None:
+                values["humidity"] = int(humidity)
+        return values
+
+    def set_poll_interval(self, interval:float):
+        """reads DS18B20 as often as the climate sources are read
+        Args:
+            interval (float): seconds between two readings
+        """
+        with self.probes_lock:
+            self.probe_interval = interval
+            for reader in self.probe_readers.values():
+                reader.interval = interval # used after current pause
+
+    def get_probe_value(self, key:str) -> float:
+        """returns cached reading of a DS18B20
+        Args:
+            key (str): key of DS18B20
+
+        Returns:
+            float: temperature, None if not found, not readable or reader hangs
+        """
+        slot = self.probe_slots.get(key)
+        if slot is None:
+            return None
+        age = slot.get_age()
+        if age is None or age > 3 * self.probe_interval: # reader hangs (e.g. bus error)
+            return None
+        return slot.get()
+
+    def read_ds18_temperature(self) -> float:
+        """returns temperature of preferred DS18B20-sensor (primary_probe, otherwise first valid probe)
+        Returns:
+            float: temperature value, accurate to 1 decimal places (3 decimal places technically possible), None if not connected
+        """
+        if self.primary_probe is not None:
+            return self.get_probe_value(PROBE_PREFIX + self.primary_probe)
+        for key in sorted(self.probe_slots):
+            value = self.get_probe_value(key)
+            if value is not None:
+                return value
+        return None
+
+    def get_temperature(self):
+        """measures current temperature from preferred DS18B20-sensor and secondly from DHT11-sensor
 
         Returns:
             float: temperature value, accurate to 1 decimal places (3 decimal places technically possible)
         """
-        if self.ds18_connected: # checks whether it has been connected once from init
-            # value of DS18B20
-            lines = self.read_raw_ds18()
-            if self.is_valid_ds18(lines): # checks if still connected
-                value = float(lines[1].strip().split("t=")[-1]) / 1000 # temperature value
-                return round(value, 1)
-        
-        if self.dht11_connected: # checks whether it has been connected once from init
-            # value of DHT11
-            humidity, temperature = Adafruit_DHT.read_retry(self.sensor_dht11, self.pin, retries=3, delay_seconds=1) # gets current data from sensor
-            if temperature == None:
-                return None
-            else:
-                return int(temperature) # sensor is not able to measure decimal places
-        
-        return None # none of them connected
-    
+        return self.fetch(["temperature"])["temperature"]
+
     def get_humidity(self):
         """measures current humidity from DHT11-sensor
         Returns:
             int: humidity value as Integer
         """
-        if self.dht11_connected:
-            humidity, temperature = Adafruit_DHT.read_retry(self.sensor_dht11, self.pin, retries=3, delay_seconds=1) # gets current data from sensor
-            if humidity == None:
-                return None
-            else:
-                return int(humidity)
-        return None
+        return self.fetch(["humidity"])["humidity"]
+
+    def close(self):
+        """stops rescan and all DS18B20 reader threads
+        """
+        self.rescan_stop_event.set()
+        if self.rescan_thread is not None:
+            self.rescan_thread.join()
+        with self.probes_lock:
+            readers = list(self.probe_readers.values())
+            self.probe_readers = {}
+        for reader in readers:
+            reader.stop()
@@ -4,8 +4,15 @@ import datetime
 
 from displays import matrix_display
 from displays import seven_segment_display
-from data_sources import solar_data
+from data_sources import inverter_group
 from data_sources import temperature_and_humidity_data
+from data_sources import sampler
+from data_sources import history
+from data_sources import registry
+from data_sources import polling_governor
+from display_controllers import scheduler
+from monitoring import metrics
+from api import server
 
 class DisplayController:
     def __init__(self, data_sources_info:dict[str:dict[str:str]],
@@ -14,149 +21,662 @@ class DisplayController:
                  password:str,
                  port:int,
                  inverter_locale:str="en_US",
+                 inverter_cache_ttl:float=1.0,
                  n_cascading_matrix:int=1,
                  block_orientation_matrix:int=0,
                  rotation_matrix:int=0,
                  inreverse_matrix:bool=False,
-                 n_cascading_segment=1):
+                 n_cascading_segment=1,
+                 background_sampling:bool=True,
+                 adaptive_polling:bool=True,
+                 history_dir:str=None,
+                 matrix_serial=None,
+                 segment_serial=None,
+                 climate_obj:temperature_and_humidity_data.TemperatureAndHumidity=None,
+                 stats_file:str=None,
+                 stats_interval:float=60,
+                 api_host:str="0.0.0.0",
+                 api_port:int=None,
+                 inverters:list[dict[str:any]]=None,
+                 dim_start:str="20:00",
+                 dim_end:str="08:00",
+                 backends:list[registry.DataSourceBackend]=None):
         """
         Args:
             data_sources_info (dict[str:dict[str:any]]): all data sources and their characteristics as string
+            inverter_cache_ttl (float): seconds one inverter snapshot is used for all inverter items
             n_cascading_matrix (int): number of cascaded matrices (MAX7219) - [>=1]
             block_orientation_matrix (int): Corrects block orientation when wired vertically - [0, 90, -90]
             rotation_matrix (int): Rotate display - [0=0°, 1=90°, 2=180°, 3=270°]
             inreverse_matrix (bool): Set to true if blocks are in reverse order - [True, False]
+            background_sampling (bool): read sources in background samplers, display threads only read cached values
+            adaptive_polling (bool): samplers read flat or idle sources less often (see "polling" in data_sources_info)
+            history_dir (str): folder to persist history of all sources in (None for memory only)
+            matrix_serial (luma.core.interface.serial): interface of matrix, None for SPI (e.g. emulation.VirtualMax7219)
+            segment_serial (luma.core.interface.serial): interface of seven segment display, None for SPI
+            climate_obj (TemperatureAndHumidity): climate sensors, None for the Raspberry Pi sensors
+            stats_file (str): JSON file for metrics and statistics (None for no file)
+            stats_interval (float): seconds between two writes of stats_file
+            api_host (str): address of local HTTP API ("127.0.0.1" for this Raspberry Pi only)
+            api_port (int): port of local HTTP API (None for no API)
+            inverters (list[dict[str:any]]): several inverters, each {"name", "ip", "username", "password", "port", "locale"} and optional "web_port"
+                                             (None for the one inverter of inverter_ip)
+            dim_start (str): start of lowest brightness - "HH:MM"
+            dim_end (str): end of lowest brightness - "HH:MM"
+            backends (list[DataSourceBackend]): additional backends (e.g. own sensors), their keys can be used in data_sources_info
         """
-        self.data_sources_info:dict[str:dict[str:any]] = data_sources_info # all data source info
+        self.data_sources_info:dict[str:dict[str:any]] = dict(data_sources_info) # all data source info (own copy, sources are added at runtime)
         self.data_sources:list = list(data_sources_info.keys()) # all data sources as string (unique name)
-        self.current_index:int = 0 # index of currently showed data source
-        self.auto_change_interval = 20 # delay before next data source change
-        self.auto_change_thread = None # thread for changing datasources automatically
-        self.lock = threading.Lock() # locks thread
+        self.current_index:int = -1 # index of currently showed data source (-1 while booting)
+        self.live_sources:set = set() # sources whose sensor or inverter is detected
+        self.history = history.History(history_dir) # readings of all sources for trend, min, max and average
+        self.lock = metrics.InstrumentedLock("controller") # locks thread, records wait and hold times
         self.paused_auto_change:bool = False # indicates whether auto change is running
-        self.reset_event = threading.Event() # starts auto change thread
-        self.update_thread = None # thread for value updates of current data source
         self.running:bool = True # flag for thread if system is running
 
-        self.matrix_display_obj = matrix_display.MatrixDisplay(n_cascading_matrix, block_orientation_matrix, rotation_matrix, inreverse_matrix) # init matrix object
-        self.seven_segment_display_obj = seven_segment_display.SevenSegmentDisplay(n_cascading_segment) # init seven segment object
+        # all timing (rotation, value refresh, brightness, pause) runs as events of one scheduler thread
+        self.scheduler = scheduler.Scheduler()
+        self.rotation_event:scheduler.ScheduledEvent = None # next data source change
+        self.refresh_event:scheduler.ScheduledEvent = None # next value update of current data source
+        self.brightness_event:scheduler.ScheduledEvent = None # next brightness change
+        self.resume_event:scheduler.ScheduledEvent = None # end of pause
+        self.default_refresh_interval:float = 1 # seconds between value updates if no refresh_interval given
+        self.dim_start:datetime.time = datetime.time.fromisoformat(dim_start) # start of lowest brightness
+        self.dim_end:datetime.time = datetime.time.fromisoformat(dim_end) # end of lowest brightness
+
+        # staged startup: displays first, then sensors and inverter concurrently in background
+        self.startup_start:float = time.monotonic()
+        self.startup_report:dict[str:float] = {} # stage -> seconds since start
+        self.startup_stages:list = ["displays", "first_value"] # stages of backends are added below
+
+        self.matrix_display_obj = matrix_display.MatrixDisplay(n_cascading_matrix, block_orientation_matrix, rotation_matrix, inreverse_matrix, matrix_serial) # init matrix object
+        self.seven_segment_display_obj = seven_segment_display.SevenSegmentDisplay(n_cascading_segment, segment_serial) # init seven segment object
         self.matrix_brightness = 1 # brightness level 2
         self.segment_brightness = 4 # brightness level 5
         self.matrix_display_obj.set_brightness(self.matrix_brightness)
         self.seven_segment_display_obj.set_brightness(self.segment_brightness)
+        self.matrix_display_obj.start_render_thread() # matrix scrolls in own thread, switches return immediately
+        self.show_boot_indicator()
+        self.record_startup_stage("displays")
 
-        self.solar_obj = solar_data.SolarData(inverter_ip, username, password, port, locale=inverter_locale) # init inverter object
-        self.climate_obj = temperature_and_humidity_data.TemperatureAndHumidity() # init climate data object
-        
+        if inverters is None: # one inverter
+            inverters = [{"name": "inverter", "ip": inverter_ip, "username": username, "password": password, "port": port, "locale": inverter_locale}]
+        aggregations = {source: info["aggregate"] for source, info in data_sources_info.items() if "aggregate" in info} # e.g. "mean" for battery_soc
+        self.solar_obj = inverter_group.InverterGroup(inverters, cache_ttl=inverter_cache_ttl, aggregations=aggregations) # init inverter object (all inverters)
+        self.climate_obj = climate_obj or temperature_and_humidity_data.TemperatureAndHumidity() # init climate data object
+
+        # every backend declares its keys, new sources are passed in backends
+        self.registry = registry.DataSourceRegistry()
+        self.registry.register(self.climate_obj)
+        for backend in backends or []:
+            self.registry.register(backend)
+        self.registry.register(self.solar_obj, fallback=True) # all other keys are inverter items
+
+        # one background sampler per backend reads all its sources in one batch, display threads only read latest values
+        self.background_sampling:bool = background_sampling
+        self.adaptive_polling:bool = adaptive_polling # governors adapt sampler intervals to changes of values
+        self.slots:dict[str:sampler.LatestValue] = {source: sampler.LatestValue() for source in self.data_sources}
+        self.samplers:dict[registry.DataSourceBackend:sampler.Sampler] = {}
+        self.governors:dict[registry.DataSourceBackend:polling_governor.PollingGovernor] = {}
+        if self.background_sampling:
+            for backend, keys in self.registry.group_keys(self.data_sources).items():
+                self.create_sampler(backend, keys)
+
+        self.sampling_started:bool = False # samplers of live sources are running
+        self.solar_obj.add_listener(self.on_inverter_snapshot) # show pushed inverter values immediately
+        for backend in self.registry.backends:
+            backend.add_key_listener(self.on_new_keys) # sensors plugged in later join the rotation
+
+        # detection steps of all backends run concurrently, each source goes live when detected
+        self.startup_threads:list = []
+        self.detected_backends:set = set() # backends whose detection steps are all finished, their sources added later are live at once
+        self.pending_stages:dict[registry.DataSourceBackend:set] = {} # backend -> detection steps not finished yet
+        for backend in self.registry.backends:
+            if not backend.get_startup_stages(): # nothing to detect, sources are live at once
+                self.detected_backends.add(backend)
+                self.set_sources_live([source for source in self.data_sources if self.registry.get_backend(source) is backend])
+            for stage, detect_function in backend.get_startup_stages():
+                self.startup_stages.append(stage)
+                self.pending_stages.setdefault(backend, set()).add(stage)
+                self.startup_threads.append(threading.Thread(target=self.run_startup_stage, args=(backend, stage, detect_function),
+                                                             name="startup-" + stage, daemon=True))
+        for startup_thread in self.startup_threads:
+            startup_thread.start()
+
+        # latency histograms, lock times and counters of all modules plus statistics of displays and inverter
+        self.stats_dumper:metrics.StatsDumper = None
+        if stats_file is not None:
+            self.stats_dumper = metrics.StatsDumper(stats_file, stats_interval, self.get_stats_providers())
+
+        # other clients (phone dashboards, second displays) read collected values instead of requesting the inverter themselves
+        self.api_server:server.ApiServer = None
+        if api_port is not None:
+            self.api_server = server.ApiServer(self.get_current_values, self.get_stats, api_host, api_port)
+
+    def show_boot_indicator(self):
+        """shows that sensors and inverter are still being detected
+        """
+        self.matrix_display_obj.show_static("...")
+        self.seven_segment_display_obj.update_display("boot")
+
+    def record_startup_stage(self, stage:str):
+        """stores time of finished startup stage, prints report when all stages are finished
+        Args:
+            stage (str): name of finished stage
+        """
+        if stage in self.startup_report:
+            return
+        self.startup_report[stage] = time.monotonic() - self.startup_start
+        if all(startup_stage in self.startup_report for startup_stage in self.startup_stages):
+            print("Startup times (s):", ", ".join(f"{name}={seconds:.2f}" for name, seconds in self.startup_report.items()))
+
+    def get_startup_report(self) -> dict[str:float]:
+        """returns seconds from start until each finished startup stage
+        Returns:
+            dict[str:float]: stage -> seconds since start
+        """
+        return dict(self.startup_report)
+
+    def run_startup_stage(self, backend:registry.DataSourceBackend, stage:str, detect_function):
+        """runs detection step of a backend and makes detected sources live
+        Args:
+            backend (registry.DataSourceBackend): backend of detection step
+            stage (str): name of startup stage
+            detect_function (function): function returning detected keys, None for all keys of backend
+        """
+        keys = detect_function()
+        if keys is None:
+            keys = [source for source in self.data_sources if self.registry.get_backend(source) is backend]
+        with self.lock: # lock thread
+            self.pending_stages[backend].discard(stage)
+            if not self.pending_stages[backend]:
+                self.detected_backends.add(backend)
+        self.on_new_keys(backend, keys)
+        self.record_startup_stage(stage)
+
+    def on_new_keys(self, backend:registry.DataSourceBackend, keys:list[str]):
+        """adds found sources which aren't configured (if backend provides their info) and makes all of them live
+        Args:
+            backend (registry.DataSourceBackend): backend providing keys
+            keys (list[str]): keys of found sources
+        """
+        for key in keys:
+            if key not in self.data_sources_info:
+                info = backend.get_source_info(key)
+                if info is not None:
+                    self.add_source(key, info)
+        self.set_sources_live(keys)
+
+    def add_source(self, source:str, info:dict[str:any]):
+        """adds data source at runtime (e.g. DS18B20 plugged in later), it is live after set_sources_live()
+        Args:
+            source (str): unique name of source
+            info (dict[str:any]): characteristics of source (like data_sources_info entries)
+        """
+        backend = self.registry.get_backend(source)
+        with self.lock: # lock thread
+            if source in self.data_sources_info:
+                return
+            self.data_sources_info[source] = info
+            self.slots.setdefault(source, sampler.LatestValue()) # source removed and added again keeps its reading
+            self.data_sources.append(source) # current_index stays valid
+            if not self.background_sampling or backend is None:
+                return
+            if backend in self.samplers:
+                if backend in self.governors:
+                    self.governors[backend].add_policy(source, polling_governor.PollingPolicy.from_info(info, backend.sample_interval))
+                self.samplers[backend].add_slot(source, self.slots[source])
+            else:
+                self.create_sampler(backend, [source])
+
+    def remove_source(self, source:str):
+        """removes data source at runtime (e.g. removed from config), the next source is shown if it is the current one
+        Args:
+            source (str): unique name of source
+        """
+        backend = self.registry.get_backend(source)
+        with self.lock: # lock thread
+            if source not in self.data_sources_info:
+                return
+            index = self.data_sources.index(source)
+            self.data_sources.remove(source)
+            del self.data_sources_info[source]
+            self.live_sources.discard(source)
+            if backend in self.samplers:
+                self.samplers[backend].remove_slot(source)
+            if backend in self.governors:
+                self.governors[backend].remove_policy(source)
+            if index < self.current_index:
+                self.current_index -= 1 # same source stays current
+            elif index == self.current_index:
+                self.current_index -= 1 # next rotation shows source after removed one
+                if self.rotation_event is not None and not self.paused_auto_change:
+                    self.scheduler.cancel(self.rotation_event)
+                    self.rotation_event = self.scheduler.schedule(0, self.rotate_data_source, "rotation")
+
+    def reconfigure_data_sources(self, old_info:dict[str:dict[str:any]], new_info:dict[str:dict[str:any]]):
+        """applies changed data_sources_info of config without restart: removed sources leave the rotation, new ones join it,
+        a new order or duration only reschedules the rotation. Readings of all sources are kept.
+        Args:
+            old_info (dict[str:dict[str:any]]): configured sources in use
+            new_info (dict[str:dict[str:any]]): configured sources of changed config
+
+        Raises:
+            ValueError: if an aggregate is unknown (nothing is changed then)
+        """
+        self.solar_obj.set_aggregations({source: info["aggregate"] for source, info in new_info.items() if "aggregate" in info})
+        for source in old_info:
+            if source not in new_info:
+                self.remove_source(source)
+        for source, info in new_info.items():
+            if source not in self.data_sources_info:
+                self.add_source(source, dict(info))
+                if self.registry.get_backend(source) in self.detected_backends: # detection of sensor or inverter finished
+                    self.set_sources_live([source])
+
+        with self.lock: # lock thread
+            current = self.data_sources[self.current_index] if self.current_index != -1 else None
+            old_duration = self.data_sources_info[current]["duration"] if current is not None else None
+            for source, info in new_info.items():
+                if self.data_sources_info[source] != info:
+                    self.data_sources_info[source] = dict(info)
+                    self.update_sampling_interval_of(source)
+            found_sources = [source for source in self.data_sources if source not in new_info] # added at runtime (e.g. DS18B20)
+            self.data_sources = list(new_info) + found_sources
+            if current is None:
+                return
+            self.current_index = self.data_sources.index(current)
+            duration = self.data_sources_info[current]["duration"]
+            if duration != old_duration and self.rotation_event is not None and not self.paused_auto_change:
+                self.scheduler.cancel(self.rotation_event) # current source is shown for its new duration
+                self.rotation_event = self.scheduler.schedule_at(max(self.rotation_event.deadline - old_duration + duration, time.monotonic()),
+                                                                 self.rotate_data_source, "rotation")
+
+    def update_sampling_interval_of(self, source:str):
+        """applies changed refresh_interval or polling of source to its sampler
+        Args:
+            source (str): unique name of source
+        """
+        backend = self.registry.get_backend(source)
+        if backend in self.governors:
+            self.governors[backend].add_policy(source, polling_governor.PollingPolicy.from_info(self.data_sources_info[source], backend.sample_interval))
+        elif backend in self.samplers:
+            source_sampler = self.samplers[backend]
+            source_sampler.interval = min(self.data_sources_info[key].get("refresh_interval", backend.sample_interval)
+                                          for key in source_sampler.slots if key in self.data_sources_info)
+
+    def set_dimming_window(self, dim_start:str, dim_end:str):
+        """changes time of lowest brightness, applied at once by the scheduler thread
+        Args:
+            dim_start (str): start of lowest brightness - "HH:MM"
+            dim_end (str): end of lowest brightness - "HH:MM"
+        """
+        def apply():
+            self.dim_start = datetime.time.fromisoformat(dim_start)
+            self.dim_end = datetime.time.fromisoformat(dim_end)
+            self.scheduler.cancel(self.brightness_event)
+            self.adjust_display_brightness_based_on_time() # schedules next change
+
+        if self.brightness_event is None: # brightness adjustment not started yet
+            self.dim_start = datetime.time.fromisoformat(dim_start)
+            self.dim_end = datetime.time.fromisoformat(dim_end)
+        else:
+            self.scheduler.schedule(0, apply, "dimming")
+
+    def create_sampler(self, backend:registry.DataSourceBackend, keys:list[str]):
+        """creates background sampler reading keys of backend in one batch (started by start_sampler_of)
+        Args:
+            backend (DataSourceBackend): backend providing keys
+            keys (list[str]): sources read by sampler
+        """
+        governor = None
+        interval = min(self.data_sources_info[key].get("refresh_interval", backend.sample_interval) for key in keys)
+        if self.adaptive_polling:
+            governor = polling_governor.PollingGovernor({key: polling_governor.PollingPolicy.from_info(self.data_sources_info[key], backend.sample_interval)
+                                                         for key in keys}, on_interval_change=backend.set_poll_interval)
+            self.governors[backend] = governor
+            interval = governor.get_interval()
+        self.samplers[backend] = sampler.Sampler(backend.name, lambda keys, backend=backend: self.registry.fetch_from(backend, keys),
+                                                 {key: self.slots[key] for key in keys}, interval, governor, self.record_history)
+
+    def set_sources_live(self, sources:list[str]):
+        """adds detected sources to rotation, starts their samplers and leaves boot indicator
+        Args:
+            sources (list[str]): unique names of detected sources (unknown names are ignored)
+        """
+        with self.lock: # lock thread
+            new_sources = [source for source in sources if source in self.data_sources and source not in self.live_sources]
+            self.live_sources.update(new_sources)
+            if self.sampling_started:
+                for source in new_sources:
+                    self.start_sampler_of(source)
+            if new_sources and self.current_index == -1 and self.rotation_event is not None and not self.paused_auto_change:
+                self.scheduler.cancel(self.rotation_event) # first live source is shown immediately
+                self.rotation_event = self.scheduler.schedule(0, self.rotate_data_source, "rotation")
 
     def switch_data_source(self):
-        """switches data source to next source
+        """switches data source to next live source, stays on boot indicator if no source is live.
+        Sources with "rotation": false (e.g. DS18B20 which aren't configured) are only read for the API.
         """
-        self.current_index = (self.current_index + 1) % len(self.data_sources) # index++
-        self.update_displays()
+        for step in range(1, len(self.data_sources) + 1):
+            index = (self.current_index + step) % len(self.data_sources) # index++
+            source = self.data_sources[index]
+            if source in self.live_sources and self.data_sources_info[source].get("rotation", True):
+                self.current_index = index
+                self.update_displays()
+                return
     
     def get_value_from_source(self, source:str) -> float:
-        """returns value of given source
+        """returns value of given source, in background sampling mode without any sensor or network I/O
         Args:
             source (str): unique name of source which is equal to data_sources_info key
         
         Returns:
             float: currently measured value of source (int if no decimal places)
         """
-        try:
-            if self.data_sources_info[source]["is_inverter_item"]: # if item to request inverter
-                value = self.solar_obj.get_data(source) # get value from source, None if error
-            else: # if item to request climate sensors
-                if source == "temperature":
-                    value = self.climate_obj.get_temperature()
-                elif source == "humidity":
-                    value = self.climate_obj.get_humidity()
-                else:
-                    value = "no data"
-            # expand if-condition here if you have another data source library/file
-
-            if value == None:
+        if self.background_sampling:
+            if source not in self.slots:
+                metrics.increment("errors.controller.KeyError")
+                print("KeyError:", source)
                 return "no data"
-            else: # returns float if value has decimal places !=0
-                if float(value) == round(float(value)): # if integer value (without decimal places)
-                    return int(float(value))
-                else:
-                    return float(value)
-        except KeyError as e:
-            print("KeyError:", e)
+            value = self.format_value(self.slots[source].get()) # latest sampled value, history is fed by the sampler
+        else:
+            raw_value = self.read_source(source)
+            self.slots[source].set(raw_value) # latest value for API clients
+            value = self.format_value(raw_value)
+            self.history.add(source, value) # stored at most once per history min_interval
+        return value
+
+    def record_history(self, values:dict[str:any]):
+        """stores readings of a sampler in the history, so all sources have a history (not only the displayed one)
+        Args:
+            values (dict[str:any]): source -> raw value
+        """
+        for source, raw_value in values.items():
+            self.history.add(source, self.format_value(raw_value)) # text values are skipped, stored at most once per history min_interval
+
+    def read_source(self, source:str):
+        """reads current raw value of given source from sensor or inverter (may block)
+        Args:
+            source (str): unique name of source which is equal to data_sources_info key
+
+        Returns:
+            any: raw value of source, None if error or no backend provides source
+        """
+        return self.registry.fetch([source])[source]
+
+    def get_current_values(self) -> dict[str:dict[str:any]]:
+        """returns latest values of all sources without any sensor or network I/O
+        Returns:
+            dict[str:dict[str:any]]: source -> "name", "alias_and_unit", "value" (like on display), "live", "trend",
+                                     "history" ("min", "max", "avg" and "count" of the stored readings), "stale" (last known value)
+                                     and "updated" (Unix time of value, None if read when requested)
+        """
+        with self.lock: # copies, sources are changed by config reloads and found sensors
+            data_sources = list(self.data_sources)
+            data_sources_info = dict(self.data_sources_info)
+            live_sources = set(self.live_sources)
+        values = {}
+        for source in data_sources:
+            backend = self.registry.get_backend(source)
+            values[source] = {"name": data_sources_info[source]["name"],
+                              "alias_and_unit": data_sources_info[source]["alias_and_unit"],
+                              "value": self.format_value(self.slots[source].get()),
+                              "live": source in live_sources,
+                              "trend": self.history.get_trend(source),
+                              "history": self.history.get_aggregates(source),
+                              "stale": self.is_stale(source),
+                              "updated": backend.get_value_time(source) if backend is not None else None}
+        return values
+
+    def is_stale(self, source:str) -> bool:
+        """returns if the value of source is the last known one (e.g. inverter unreachable)
+        Args:
+            source (str): unique name of source
+
+        Returns:
+            bool: True if value is outdated
+        """
+        backend = self.registry.get_backend(source)
+        return backend is not None and backend.is_stale(source)
+
+    def get_scroll_text(self, source:str) -> str:
+        """returns text scrolled on matrix, with lowest and highest stored reading if "show_min_max" is set for source
+        Args:
+            source (str): unique name of source
+
+        Returns:
+            str: name of source (e.g. "Batterie" or "Batterie 12..98")
+        """
+        source_name = self.data_sources_info[source]["name"]
+        if not self.data_sources_info[source].get("show_min_max"):
+            return source_name
+        aggregates = self.history.get_aggregates(source)
+        if aggregates["count"] == 0:
+            return source_name
+        return f"{source_name} {self.format_value(round(aggregates['min'], 1))}..{self.format_value(round(aggregates['max'], 1))}"
+
+
+    def format_value(self, value) -> float:
+        """converts raw value of a source to displayed value
+        Args:
+            value (any): raw value, None if error
+
+        Returns:
+            float: value (int if no decimal places), "no data" if None, text values unchanged (e.g. running state "Run")
+        """
+        if value == None or value == "no data":
             return "no data"
+        try:
+            number = float(value)
+            if number == round(number): # if integer value (without decimal places)
+                return int(number)
+        except (TypeError, ValueError, OverflowError): # text (e.g. translated state) or infinite value
+            return value
+        return number # returns float if value has decimal places !=0
+
+    def on_inverter_snapshot(self, snapshot:dict[str:any]):
+        """shows value of pushed inverter snapshot if an inverter item is currently displayed
+        Args:
+            snapshot (dict[str:any]): all inverter items with their values
+        """
+        for source in snapshot: # write pushed values into slots of inverter items
+            if source in self.slots and self.registry.get_backend(source) is self.solar_obj:
+                self.slots[source].set(snapshot[source])
+        if not self.lock.acquire(blocking=False): # display busy, next regular update shows value
+            return
+        try:
+            if self.current_index == -1: # still booting
+                return
+            source = self.data_sources[self.current_index]
+            if self.registry.get_backend(source) is self.solar_obj:
+                self.show_value(source, self.format_value(snapshot.get(source)))
+        finally:
+            self.lock.release()
     
     def update_displays(self):
         """updates text and value from displays to next data source
         """
         source = self.data_sources[self.current_index] # source key
         value = self.get_value_from_source(source) # numeric value
-        source_name = self.data_sources_info[source]["name"] # name to show for scrolling text
+        source_name = self.get_scroll_text(source) # name (and min-max) to show for scrolling text
         source_unit = self.data_sources_info[source]["alias_and_unit"] # unit to show as static display on matrix
-        self.seven_segment_display_obj.update_display("") # clear sevensegment first
-        self.matrix_display_obj.update_display(source_name, source_unit) # scrolling text, then alias + unit
-        self.seven_segment_display_obj.update_display(value) # show numeric value
+        trend = self.history.get_trend(source) # arrow after unit
+        self.matrix_display_obj.update_display(source_name, source_unit, trend) # scrolling text, then alias + unit (returns immediately)
+        self.show_value(source, value) # show numeric value (dot at end if outdated)
 
-    def auto_update(self):
-        """Switches data source after auto_change_interval seconds
+    def show_value(self, source:str, value):
+        """shows value of source on seven segment display, the first real value finishes startup stage "first_value"
+        Args:
+            source (str): unique name of shown source
+            value (any): formatted value ("no data" if not available)
+        """
+        self.seven_segment_display_obj.update_display(value, self.is_stale(source))
+        if value != "no data":
+            self.record_startup_stage("first_value")
+
+    def rotate_data_source(self):
+        """switches to next data source and schedules next switch after duration of new source
+        """
+        with self.lock: # lock thread
+            if self.paused_auto_change: # paused (e.g. for button-click event)
+                return
+            try:
+                self.switch_data_source()
+            finally: # rotation goes on if showing a source failed
+                duration = self.data_sources_info[self.data_sources[self.current_index]]["duration"]
+                # next deadline relative to this deadline, so delays of the thread don't add up
+                self.rotation_event = self.scheduler.schedule_at(max(self.rotation_event.deadline + duration, time.monotonic()),
+                                                                 self.rotate_data_source, "rotation")
+
+    def refresh_current_data_source(self):
+        """updates value of current data source and schedules next refresh after its refresh_interval
+        """
+        with self.lock: # lock thread
+            interval = self.default_refresh_interval # while booting or if reading failed
+            try:
+                if self.current_index != -1:
+                    source = self.data_sources[self.current_index]
+                    interval = self.get_refresh_interval(source)
+                    value = self.get_value_from_source(source)
+                    self.show_value(source, value)
+            finally: # refresh goes on if reading failed
+                self.refresh_event = self.scheduler.schedule_at(max(self.refresh_event.deadline + interval, time.monotonic()),
+                                                                self.refresh_current_data_source, "refresh")
+
+    def get_refresh_interval(self, source:str) -> float:
+        """returns seconds between two value updates of source
+        Args:
+            source (str): unique name of source which is equal to data_sources_info key
+
+        Returns:
+            float: refresh_interval of source, default 1 second
         """
-        while self.running:
-            with self.lock: # lock thread 
-                if not self.paused_auto_change: # if not paused (e.g. for button-click event)
-                    self.switch_data_source()
-            self.adjust_display_brightness_based_on_time()
-            self.reset_event.wait(self.data_sources_info[self.data_sources[self.current_index]]["duration"]) # wait for event or next timeout
+        return self.data_sources_info[source].get("refresh_interval", self.default_refresh_interval)
 
     def pause_auto_update(self, duration=30):
-        """Pause auto changing data sources
+        """Pause auto changing data sources for duration seconds (returns immediately)
         """
         with self.lock: # lock thread
-            self.paused = True
-        self.reset_event.clear()
-        time.sleep(duration) # start auto changing after 30s
-        with self.lock:
-            self.paused = False
-        self.reset_event.set() # set event
+            self.paused_auto_change = True
+            self.scheduler.cancel(self.rotation_event)
+            self.scheduler.cancel(self.resume_event) # a new pause replaces the previous one
+            self.resume_event = self.scheduler.schedule(duration, self.resume_auto_update, "resume")
+
+    def resume_auto_update(self):
+        """continues auto changing data sources after a pause
+        """
+        with self.lock: # lock thread
+            if not self.paused_auto_change:
+                return
+            self.paused_auto_change = False
+            self.scheduler.cancel(self.resume_event)
+            self.rotation_event = self.scheduler.schedule(0, self.rotate_data_source, "rotation")
+
+    def start_sampling_threads(self):
+        """starts one background sampler per live data source (only in background sampling mode), others start when detected
+        """
+        with self.lock: # lock thread
+            self.sampling_started = True
+            for source in self.live_sources:
+                self.start_sampler_of(source)
+
+    def start_sampler_of(self, source:str):
+        """starts sampler of the backend providing source (if not running yet)
+        Args:
+            source (str): unique name of source which is equal to data_sources_info key
+        """
+        backend = self.registry.get_backend(source)
+        if backend in self.samplers:
+            self.samplers[backend].start()
 
     def start_auto_update_thread(self):
-        """starts auto changing data sources in background thread
+        """starts auto changing data sources and brightness adjustment in scheduler thread
         """
-        self.auto_change_thread = threading.Thread(target=self.auto_update) # creates thread for auto changing data sources
-        self.auto_change_thread.start() # starts this thread
-    
+        self.rotation_event = self.scheduler.schedule(0, self.rotate_data_source, "rotation")
+        self.brightness_event = self.scheduler.schedule(0, self.adjust_display_brightness_based_on_time, "brightness")
+        self.scheduler.start()
+
+    def get_stats_providers(self) -> dict:
+        """returns functions providing statistics of displays, inverter and startup
+        Returns:
+            dict[str:function]: section name -> function without parameters
+        """
+        return {"startup": self.get_startup_report,
+                "inverter": self.solar_obj.get_stats,
+                "matrix": self.matrix_display_obj.get_write_stats,
+                "seven_segment": self.seven_segment_display_obj.get_write_stats,
+                "frame_cache": lambda: {"hits": self.matrix_display_obj.frame_cache.hits, "misses": self.matrix_display_obj.frame_cache.misses},
+                "api": lambda: self.api_server.get_stats() if self.api_server is not None else None,
+                "polling": lambda: {backend.name: governor.get_stats() for backend, governor in list(self.governors.items())}}
+
+    def get_stats(self) -> dict[str:any]:
+        """returns metrics of all modules and statistics of displays, inverter and startup
+        Returns:
+            dict[str:any]: "metrics" and one section per statistics provider
+        """
+        return metrics.collect_stats(self.get_stats_providers())
+
+    def start_stats_thread(self):
+        """starts periodic writing of stats file (does nothing without stats file)
+        """
+        if self.stats_dumper is not None:
+            self.stats_dumper.start()
+
+    def start_api_server(self):
+        """starts local HTTP API in background (does nothing without api_port)
+        """
+        if self.api_server is not None:
+            self.api_server.start()
+
     def start_update_thread(self):
-        """Starts Thread for value updates every second
+        """starts value updates of current data source in scheduler thread
         """
-        self.update_thread = threading.Thread(target=self.update_current_data_source) # creates thread for updating value of current data source
-        self.update_thread.start() # starts this thread
-    
-    def update_current_data_source(self):
-        """update value of current data source
-        """
-        while self.running:
-            with self.lock: # lock thread
-                source = self.data_sources[self.current_index]
-                value = self.get_value_from_source(source)
-                self.seven_segment_display_obj.update_display(value)
-            time.sleep(1)
-    
+        self.refresh_event = self.scheduler.schedule(0, self.refresh_current_data_source, "refresh")
+        self.scheduler.start()
+
+    def get_seconds_until_brightness_change(self) -> float:
+        """returns seconds until next start or end of the dimming window
+        Returns:
+            float: seconds until next brightness change
+        """
+        now = datetime.datetime.now()
+        changes = []
+        for change_time in (self.dim_start, self.dim_end):
+            change = datetime.datetime.combine(now.date(), change_time)
+            if change <= now:
+                change += datetime.timedelta(days=1)
+            changes.append(change)
+        return (min(changes) - now).total_seconds()
+
     def adjust_display_brightness_based_on_time(self):
-        """decreases brightness of displays in the night
+        """decreases brightness of displays in the night and schedules next brightness change
         """
-        current_time = datetime.datetime.now().time()
-        if datetime.time(20,0) <= current_time or current_time <= datetime.time(8, 0):
-            # lowest brightness
-            self.matrix_display_obj.set_brightness(0)
-            self.seven_segment_display_obj.set_brightness(0)
-        else:
-            self.matrix_display_obj.set_brightness(self.matrix_brightness)
-            self.seven_segment_display_obj.set_brightness(self.segment_brightness)
-    
+        try:
+            current_time = datetime.datetime.now().time()
+            if polling_governor.is_in_time_window(current_time, self.dim_start, self.dim_end):
+                # lowest brightness
+                self.matrix_display_obj.set_brightness(0)
+                self.seven_segment_display_obj.set_brightness(0)
+            else:
+                self.matrix_display_obj.set_brightness(self.matrix_brightness)
+                self.seven_segment_display_obj.set_brightness(self.segment_brightness)
+        finally: # dimming goes on if writing brightness failed
+            self.brightness_event = self.scheduler.schedule(self.get_seconds_until_brightness_change(), self.adjust_display_brightness_based_on_time, "brightness")
+
     def stop(self):
         """Ends all threads and process controlled
         """
         self.running = False
-        if self.update_thread: # if thread is not None
-            self.update_thread.join() # waits until the thread terminates
-        if self.auto_change_thread: # if thread is not None
-            self.auto_change_thread.join() # waits until the thread terminates
+        with self.lock: # lock thread
+            self.sampling_started = False # detected sources don't start samplers anymore
+        for source_sampler in list(self.samplers.values()):
+            source_sampler.stop() # waits until current reading is finished
+        self.scheduler.stop() # waits until current event is finished
+        self.matrix_display_obj.stop_render_thread() # interrupts current scroll
+        if self.api_server is not None:
+            self.api_server.stop() # ends event streams
+        if self.stats_dumper is not None:
+            self.stats_dumper.stop() # writes final stats
+        self.registry.close() # closes inverter session and sensor threads
+        self.history.close() # writes history to files
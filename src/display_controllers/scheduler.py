@@ -0,0 +1,110 @@
+import heapq
+import itertools
+import threading
+import time
+
+from monitoring import metrics
+
+class ScheduledEvent:
+    def __init__(self, deadline:float, callback, name:str=""):
+        """
+        Args:
+            deadline (float): monotonic time the callback is due
+            callback (function): function without parameters
+            name (str): name of the event (for debugging)
+        """
+        self.deadline = deadline
+        self.callback = callback
+        self.name = name
+        self.cancelled:bool = False
+
+class Scheduler:
+    def __init__(self):
+        """runs timed callbacks in one thread, which only wakes up when the next deadline is due
+        """
+        self.heap:list = [] # (deadline, sequence number, event), earliest deadline first
+        self.counter = itertools.count() # keeps events with equal deadline in order
+        self.condition = threading.Condition() # protects heap, wakes thread on new earlier events
+        self.thread:threading.Thread = None
+        self.running:bool = False
+
+    def schedule_at(self, deadline:float, callback, name:str="") -> ScheduledEvent:
+        """runs callback at monotonic time deadline
+        Args:
+            deadline (float): monotonic time the callback is due
+            callback (function): function without parameters
+            name (str): name of the event
+
+        Returns:
+            ScheduledEvent: event to cancel it or to schedule the next one relative to its deadline
+        """
+        event = ScheduledEvent(deadline, callback, name)
+        with self.condition:
+            heapq.heappush(self.heap, (deadline, next(self.counter), event))
+            self.condition.notify() # thread may have to wake up earlier
+        return event
+
+    def schedule(self, delay:float, callback, name:str="") -> ScheduledEvent:
+        """runs callback after delay seconds
+        Args:
+            delay (float): seconds from now
+            callback (function): function without parameters
+            name (str): name of the event
+
+        Returns:
+            ScheduledEvent: event to cancel it or to schedule the next one relative to its deadline
+        """
+        return self.schedule_at(time.monotonic() + delay, callback, name)
+
+    def cancel(self, event:ScheduledEvent):
+        """cancels event if not run yet (removed lazily from heap)
+        Args:
+            event (ScheduledEvent): event to cancel, None is ignored
+        """
+        if event is not None:
+            event.cancelled = True
+
+    def run(self):
+        """runs due events until stopped
+        """
+        while True:
+            with self.condition:
+                while self.running:
+                    if not self.heap:
+                        self.condition.wait()
+                        continue
+                    deadline, _, event = self.heap[0]
+                    if event.cancelled:
+                        heapq.heappop(self.heap)
+                        continue
+                    delay = deadline - time.monotonic()
+                    if delay <= 0:
+                        heapq.heappop(self.heap)
+                        break
+                    self.condition.wait(delay)
+                if not self.running:
+                    return
+            try:
+                event.callback() # run without holding condition, callbacks may schedule events
+            except Exception as e: # periodic callbacks schedule their next event in finally, so they go on
+                metrics.increment("errors.scheduler." + (event.name or "event") + "." + type(e).__name__)
+                print("Scheduler event", event.name, "error:", type(e).__name__, e)
+
+    def start(self):
+        """starts scheduler thread (does nothing if already running)
+        """
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+        self.thread = threading.Thread(target=self.run, name="scheduler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """stops scheduler thread after current event
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread: # if thread is not None
+            self.thread.join()
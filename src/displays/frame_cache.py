@@ -0,0 +1,136 @@
+import collections
+
+from PIL import Image, ImageDraw
+from luma.core.legacy import text, textsize
+
+from monitoring import metrics
+
+def get_trend_arrow_column(unit:str, width:int, measure) -> int:
+    """returns left column of the 3 pixel wide trend arrow: at right edge if it fits after the text,
+    otherwise in place of the space between alias and unit (space glyph is wide enough for arrow and a gap on narrow matrices)
+    Args:
+        unit (str): alias and unit (e.g. "T C")
+        width (int): width of matrix in pixel
+        measure (function): returns width of a text in pixel with the font of the frame
+
+    Returns:
+        int: left column of arrow, None if it doesn't fit without covering the text
+    """
+    if measure(unit) + 3 <= width:
+        return width - 3
+    if " " in unit:
+        x = measure(unit[:unit.index(" ")])
+        if measure(" ") >= 4 and x + 3 <= width: # arrow and one empty column before the unit
+            return x
+    return None
+
+class FrameCache:
+    def __init__(self, max_entries:int=16):
+        """least recently used cache of pre-rendered matrix frames
+        Args:
+            max_entries (int): number of cached texts (scroll strips and unit screens) - [>=1]
+        """
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict() # key -> list of frames (oldest used first)
+        self.hits:int = 0
+        self.misses:int = 0
+
+    def get_key(self, kind:str, device, content, font) -> tuple:
+        """returns cache key of content on device
+        Args:
+            kind (str): "scroll" or "static"
+            device (luma.core.device.device): device the frames are rendered for
+            content (any): rendered content (hashable)
+            font (luma.core.legacy.font.proportional): font of text
+
+        Returns:
+            tuple: (kind, content, font, device geometry, rotation)
+        """
+        return (kind, content, id(font), device.width, device.height, device.rotate)
+
+    def get(self, key:tuple, render_function) -> list[bytes]:
+        """returns cached frames of key, renders and stores them on first use
+        Args:
+            key (tuple): cache key
+            render_function (function): function without parameters returning list of frames
+
+        Returns:
+            list[bytes]: frames as returned by render_function
+        """
+        frames = self.entries.get(key)
+        if frames is not None:
+            self.hits += 1
+            self.entries.move_to_end(key) # most recently used
+            return frames
+        self.misses += 1
+        with metrics.timer("matrix.render"):
+            frames = render_function()
+        self.entries[key] = frames
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False) # evict least recently used
+        return frames
+
+    def get_scroll_frames(self, device, message:str, font, framebuffer=None) -> list[bytes]:
+        """returns all frames of message scrolling right-to-left across device (same frames as luma's show_message)
+        Args:
+            device (luma.core.device.device): device the frames are rendered for
+            message (str): text to scroll (ASCII only)
+            font (luma.core.legacy.font.proportional): font of text
+            framebuffer (PackedFramebuffer): renders frames as digit registers (None for PIL)
+
+        Returns:
+            list[bytes]: frames as digit registers with framebuffer, otherwise as packed 1-bit buffers
+        """
+        def render() -> list[bytes]:
+            if framebuffer is not None:
+                return framebuffer.render_scroll_frames(message, font)
+            w, h = textsize(message, font)
+            x = device.width
+            strip = Image.new("1", (w + x + x, device.height)) # full scroll strip, text starts after one empty screen
+            text(ImageDraw.Draw(strip), (x, 0), message, fill="white", font=font)
+            return [strip.crop((i, 0, i + device.width, device.height)).tobytes() for i in range(w + x + 1)]
+
+        return self.get(self.get_key("scroll", device, message, font), render)
+
+    def get_unit_frame(self, device, unit:str, font, trend:int=0, framebuffer=None) -> bytes:
+        """returns static frame with alias and unit
+        Args:
+            device (luma.core.device.device): device the frame is rendered for
+            unit (str): alias and unit (e.g. "T C")
+            font (luma.core.legacy.font.proportional): font of text
+            trend (int): arrow at right edge or in place of the space, see get_trend_arrow_column() - [1 rising, -1 falling, 0 none]
+            framebuffer (PackedFramebuffer): renders frame as digit registers (None for PIL)
+
+        Returns:
+            bytes: frame as digit registers with framebuffer, otherwise as packed 1-bit buffer
+        """
+        def render() -> list[bytes]:
+            if framebuffer is not None:
+                return [framebuffer.render_unit_frame(unit, font, trend)]
+            image = Image.new("1", device.size)
+            draw = ImageDraw.Draw(image)
+            # TODO: alias flush left, unit flush right without creating new character set
+            if unit[-1] == "C": # Celsius as unit (last letter is "C")
+                # TODO: dot position in relative distance to the "C"
+                draw.point((8,0), fill="white") # dot for degree sign (font doesn't contain degree char)
+            text(draw, (0, 0), unit, fill="white", font=font)
+            if trend != 0:
+                x = get_trend_arrow_column(unit, device.width, lambda t: textsize(t, font)[0])
+                if x is not None:
+                    self.draw_trend_arrow(draw, x, trend)
+            return [image.tobytes()]
+
+        return self.get(self.get_key("static", device, (unit, trend), font), render)[0]
+
+    def draw_trend_arrow(self, draw, x:int, trend:int):
+        """draws 3 pixel wide arrow (rows 1 to 6)
+        Args:
+            draw (PIL.ImageDraw): canvas to draw on
+            x (int): left column of arrow
+            trend (int): 1 rising (arrow up), -1 falling (arrow down)
+        """
+        tip, wing = (1, 2) if trend > 0 else (6, 5)
+        draw.line((x + 1, 1, x + 1, 6), fill="white") # shaft
+        draw.point((x + 1, tip), fill="white")
+        draw.point((x, wing), fill="white")
+        draw.point((x + 2, wing), fill="white")
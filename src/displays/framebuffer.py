@@ -0,0 +1,137 @@
+from PIL import Image
+
+from displays.frame_cache import get_trend_arrow_column
+
+class PackedFramebuffer:
+    def __init__(self, device):
+        """bit-packed matrix content: one byte per column of the 8 pixel high chain (bit 0 = top row), like the glyphs of luma's legacy fonts.
+        Frames are converted to digit registers through lookup tables derived once from luma's own rotation, block orientation and block order,
+        so no image is created per frame. Only chains 8 pixels high (rotation 0 or 2) are supported, see is_supported().
+        Args:
+            device (luma.led_matrix.device.max7219): device the frames are rendered for
+        """
+        self.width:int = device.width
+        self.height:int = device.height
+        self.cascaded:int = device.cascaded
+        self.glyph_tables:dict[int:list[bytes]] = {} # id(font) -> packed columns of all 256 characters
+        self.column_tables:list[tuple] = [] # column -> (chip in SPI buffer order, table byte -> 64 bit register value of chip)
+        if self.is_supported(device):
+            self.column_tables = self.create_column_tables(device)
+
+    @staticmethod
+    def is_supported(device) -> bool:
+        """returns if the logical display is one row of 8 pixels (rotation 0 or 2), otherwise frames are drawn with PIL
+        """
+        return device.height == 8
+
+    def create_column_tables(self, device) -> list[tuple]:
+        """sends an image with the index of every pixel through device.preprocess and reads back where each pixel ends up
+        in the digit registers (same mapping as luma's max7219.display)
+        Args:
+            device (luma.led_matrix.device.max7219): device the frames are rendered for
+
+        Returns:
+            list[tuple]: (chip, lookup table) per logical column
+        """
+        index_image = Image.new("I", device.size)
+        index_image.putdata(range(1, self.width * self.height + 1)) # 0 stays free for pixels outside the image
+        physical = device.preprocess(index_image)
+        physical_width, physical_height = physical.size
+        pix = list(physical.getdata())
+        offsets = [(y * physical_width) + x
+                   for y in range(physical_height - 8, -8, -8)
+                   for x in range(physical_width - 8, -8, -8)]
+        positions = {} # logical pixel index -> (chip, bit in 64 bit register value of chip)
+        for chip, offset in enumerate(offsets):
+            for digit in range(8):
+                for y in range(8):
+                    positions[pix[offset + digit + y * physical_width] - 1] = (chip, digit * 8 + y)
+
+        shared_tables:dict[tuple:list[int]] = {} # columns of all blocks are mapped alike, so few tables are built
+        column_tables = []
+        for x in range(self.width):
+            targets = [positions[y * self.width + x] for y in range(8)]
+            chip = targets[0][0]
+            bits = tuple(bit for _, bit in targets)
+            table = shared_tables.get(bits)
+            if table is None:
+                table = shared_tables[bits] = [sum(1 << bits[y] for y in range(8) if value >> y & 1) for value in range(256)]
+            column_tables.append((chip, table))
+        return column_tables
+
+    def get_glyphs(self, font) -> list[bytes]:
+        """returns pre-packed columns of every character of font
+        Args:
+            font (luma.core.legacy.font.proportional): font of text
+
+        Returns:
+            list[bytes]: columns per ASCII code
+        """
+        glyphs = self.glyph_tables.get(id(font))
+        if glyphs is None:
+            glyphs = self.glyph_tables[id(font)] = [bytes(font[code]) for code in range(256)]
+        return glyphs
+
+    def render_text(self, message:str, font) -> bytes:
+        """returns columns of message (same pixels as luma's legacy text)
+        Args:
+            message (str): text (ASCII only)
+            font (luma.core.legacy.font.proportional): font of text
+
+        Returns:
+            bytes: one byte per column
+        """
+        glyphs = self.get_glyphs(font)
+        return b"".join(glyphs[ord(char)] for char in message)
+
+    def to_registers(self, columns) -> bytes:
+        """converts one frame to digit registers
+        Args:
+            columns (bytes): one byte per logical column (width bytes)
+
+        Returns:
+            bytes: 8 digit registers per chip in SPI buffer order
+        """
+        chips = [0] * self.cascaded
+        for (chip, table), value in zip(self.column_tables, columns):
+            if value:
+                chips[chip] |= table[value]
+        return b"".join(chip.to_bytes(8, "little") for chip in chips) # byte n of a chip is digit n
+
+    def render_scroll_frames(self, message:str, font) -> list[bytes]:
+        """returns all frames of message scrolling right-to-left, the text starts after one empty screen (same frames as luma's show_message)
+        Args:
+            message (str): text to scroll (ASCII only)
+            font (luma.core.legacy.font.proportional): font of text
+
+        Returns:
+            list[bytes]: frames as digit registers
+        """
+        text_columns = self.render_text(message, font)
+        empty = bytes(self.width)
+        strip = empty + text_columns + empty
+        return [self.to_registers(strip[i:i + self.width]) for i in range(len(text_columns) + self.width + 1)]
+
+    def render_unit_frame(self, unit:str, font, trend:int=0) -> bytes:
+        """returns static frame with alias and unit (same pixels as FrameCache.get_unit_frame with PIL)
+        Args:
+            unit (str): alias and unit (e.g. "T C")
+            font (luma.core.legacy.font.proportional): font of text
+            trend (int): arrow at right edge or in place of the space, see get_trend_arrow_column() - [1 rising, -1 falling, 0 none]
+
+        Returns:
+            bytes: frame as digit registers
+        """
+        columns = bytearray(self.width)
+        text_columns = self.render_text(unit, font)
+        text_columns = text_columns[:self.width] # longer text is cut like on the PIL canvas
+        columns[:len(text_columns)] = text_columns
+        if unit[-1] == "C" and self.width > 8: # Celsius as unit (last letter is "C")
+            columns[8] |= 0x01 # dot for degree sign (font doesn't contain degree char)
+        x = get_trend_arrow_column(unit, self.width, lambda t: len(self.render_text(t, font))) if trend != 0 else None
+        if x is not None:
+            wing = 1 << (2 if trend > 0 else 5)
+            columns[x] |= wing
+            columns[x + 1] |= 0x7E # shaft rows 1 to 6 including tip
+            columns[x + 2] |= wing
+        return self.to_registers(columns)
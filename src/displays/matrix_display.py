@@ -1,53 +1,220 @@
+import time
+import threading
+import collections
+
+from PIL import Image
 from luma.led_matrix.device import max7219
 from luma.core.interface.serial import spi, noop
-from luma.core.render import canvas
-from luma.core.virtual import viewport
-from luma.core.legacy import text, show_message
 from luma.core.legacy.font import proportional, LCD_FONT
 
+from displays.frame_cache import FrameCache
+from displays.framebuffer import PackedFramebuffer
+from displays.max7219_registers import RegisterShadow
+from monitoring import metrics
+
 class MatrixDisplay:
-    def __init__(self, n_cascading:int=1, block_orientation:int=0, rotation:int=0, inreverse:bool=False):
+    def __init__(self, n_cascading:int=1, block_orientation:int=0, rotation:int=0, inreverse:bool=False, serial_interface=None):
         """
         Args:
             n_cascading (int): number of cascaded matrices (MAX7219) - [>=1]
             block_orientation (int): Corrects block orientation when wired vertically - [0, 90, -90]
             rotation (int): Rotate display - [0=0°, 1=90°, 2=180°, 3=270°]
             inreverse (bool): Set to true if blocks are in reverse order - [True, False]
+            serial_interface (luma.core.interface.serial): interface to the chips, None for SPI CE0 (e.g. emulation.VirtualMax7219)
         """
         self.current_text:str = None # currently showed text
         self.font = proportional(LCD_FONT) # default font
         self.scroll_delay = 0.08 # default scroll speed lower=faster
+        self.frame_cache = FrameCache() # pre-rendered scroll and unit frames
+
+        # render loop consuming commands, so callers never wait for a scroll
+        self.commands = collections.deque() # pending commands (name, argument)
+        self.commands_changed = threading.Condition() # protects commands
+        self.interrupt_event = threading.Event() # set to abort the in-progress scroll
+        self.pending_brightness:int = None # brightness written before next frame, even during a scroll (protected by commands_changed)
+        self.render_thread:threading.Thread = None
 
         # create matrix device
-        self.serial = spi(port=0, device=0, gpio=noop()) # device 0 = CE0
+        self.serial = serial_interface or spi(port=0, device=0, gpio=noop()) # device 0 = CE0
         self.device = max7219(self.serial, cascaded=n_cascading, block_orientation=block_orientation,
                               rotate=rotation, blocks_arranged_in_reverse_order=inreverse)
-        self.device.contrast(0) # brightness
-        
+        self.registers = RegisterShadow(self.device) # only changed digits and brightness are sent
+        self.framebuffer:PackedFramebuffer = None # frames as digit registers, None for PIL frames (rotation 1 or 3)
+        if PackedFramebuffer.is_supported(self.device):
+            self.framebuffer = PackedFramebuffer(self.device)
+        self.registers.write_intensity(0) # brightness
+        self.current_frame:bytes = None # currently showed frame
+        self.frames_skipped:int = 0 # frames skipped because identical to current frame
+        self.brightness:int = 0 # last requested brightness
+
     
-    def update_display(self, source_name:str, unit:str):
-        """Changes text on matrix
+    def update_display(self, source_name:str, unit:str, trend:int=0):
+        """Changes text on matrix, replaces an in-progress scroll.
+        Returns immediately if render thread is running.
         Args:
             source_name (str): text to update matrix
             unit (str): unit of updated data
+            trend (int): trend arrow after unit - [1 rising, -1 falling, 0 none]
+        """
+        if self.render_thread is None: # no render thread -> draw in caller's thread
+            self.scroll_text(source_name)
+            self.show_unit((unit, trend))
+            return
+        self.post_command(("scroll", source_name), replace=True)
+        self.post_command(("unit", (unit, trend)))
+
+    def scroll_text(self, source_name:str):
+        """scrolls text once across the matrix (blocks until finished or interrupted)
+        Args:
+            source_name (str): text to scroll
+        """
+        self.current_text = source_name
+        self.play_frames(self.frame_cache.get_scroll_frames(self.device, source_name, self.font, self.framebuffer))
+
+    def show_unit(self, unit_and_trend:tuple):
+        """shows static alias and unit
+        Args:
+            unit_and_trend (tuple): alias and unit of data, trend arrow - [1 rising, -1 falling, 0 none]
+        """
+        unit, trend = unit_and_trend
+        self.show_frame(self.frame_cache.get_unit_frame(self.device, unit, self.font, trend, self.framebuffer))
+
+    def show_static(self, static_text:str):
+        """shows static text without scrolling, replaces an in-progress scroll
+        Args:
+            static_text (str): short text which fits on the matrix
+        """
+        if self.render_thread is None:
+            self.show_unit((static_text, 0))
+        else:
+            self.post_command(("unit", (static_text, 0)), replace=True)
+
+    def post_command(self, command:tuple, replace:bool=False):
+        """hands command to the render thread
+        Args:
+            command (tuple): ("scroll", text), ("unit", (unit, trend)) or ("stop", None)
+            replace (bool): interrupt in-progress scroll and drop pending scroll and unit commands
+        """
+        with self.commands_changed:
+            if replace:
+                self.commands = collections.deque(c for c in self.commands if c[0] not in ("scroll", "unit"))
+                self.interrupt_event.set()
+            self.commands.append(command)
+            self.commands_changed.notify()
+
+    def render_loop(self):
+        """executes commands one after another until stop command
         """
-        show_message(self.device, source_name, fill="white", font=self.font, scroll_delay=self.scroll_delay)
-        with canvas(self.device) as draw:
-            # TODO: alias flush left, unit flush right without creating new character set
-            if unit[-1] == "C": # Celsius as unit (last letter is "C")
-                # TODO: dot position in relative distance to the "C"
-                draw.point((8,0), fill="white") # dot for degree sign (font doesn't contain degree char)
-            text(draw, (0, 0), unit, fill="white", font=self.font)
+        while True:
+            with self.commands_changed:
+                while not self.commands and self.pending_brightness is None:
+                    self.commands_changed.wait()
+                command = self.commands.popleft() if self.commands else None
+                if command is not None:
+                    self.interrupt_event.clear() # earlier interrupts are done
+            if command is not None and command[0] == "stop":
+                break
+            try:
+                self.apply_pending_brightness()
+                if command is None: # only brightness changed
+                    continue
+                name, argument = command
+                if name == "scroll":
+                    self.scroll_text(argument)
+                elif name == "unit":
+                    self.show_unit(argument)
+            except Exception as e: # matrix keeps showing the next commands
+                metrics.increment("errors.matrix." + type(e).__name__)
+                print("Matrix render error:", type(e).__name__, e)
+
+    def start_render_thread(self):
+        """starts render thread, afterwards all drawing is done there
+        """
+        self.render_thread = threading.Thread(target=self.render_loop, name="matrix-render", daemon=True)
+        self.render_thread.start()
+
+    def stop_render_thread(self):
+        """interrupts current scroll and ends render thread
+        """
+        if self.render_thread: # if thread is not None
+            self.post_command(("stop", None), replace=True)
+            self.render_thread.join()
+            self.render_thread = None
+
+    def show_frame(self, frame:bytes):
+        """draws one pre-rendered frame
+        Args:
+            frame (bytes): frame as digit registers (with framebuffer) or packed 1-bit buffer
+        """
+        if frame == self.current_frame: # identical frame
+            self.frames_skipped += 1
+            return
+        self.current_frame = frame
+        with metrics.timer("matrix.frame"): # conversion and SPI writes
+            if self.framebuffer is not None: # already converted when rendered
+                self.registers.write_digits([frame[chip * 8:chip * 8 + 8] for chip in range(self.registers.cascaded)])
+                return
+            image = self.device.preprocess(Image.frombytes("1", self.device.size, frame)) # rotation and block orientation
+            self.registers.write_digits(self.registers.image_to_registers(image))
+
+    def play_frames(self, frames:list[bytes]):
+        """draws frames one after another, each at a fixed deadline (monotonic clock) so render time doesn't add up
+        Args:
+            frames (list[bytes]): frames as digit registers (with framebuffer) or packed 1-bit buffers
+        """
+        start = time.monotonic()
+        for i, frame in enumerate(frames):
+            deadline = start + i * self.scroll_delay
+            if self.interrupt_event.wait(max(0, deadline - time.monotonic())): # scroll replaced or display stopped
+                return
+            metrics.observe("matrix.scroll_jitter", abs(time.monotonic() - deadline)) # frame later (or earlier) than planned
+            self.apply_pending_brightness() # between two frames, so a long scroll doesn't delay dimming
+            self.show_frame(frame)
     
     def set_brightness(self, level:int):
         """Brightness property
         Args:
             level (int): numeric value from 0 up to 15
         """
+        if level == self.brightness: # unchanged brightness isn't queued at all
+            self.registers.writes_skipped += self.registers.cascaded
+            return
+        self.brightness = level
+        if self.render_thread is None:
+            self.apply_brightness(level)
+        else:
+            with self.commands_changed: # written by render thread before its next frame
+                self.pending_brightness = level
+                self.commands_changed.notify()
+
+    def apply_pending_brightness(self):
+        """writes brightness requested since the last frame (render thread only, so SPI writes never interleave)
+        """
+        if self.pending_brightness is None: # checked without lock on every frame
+            return
+        with self.commands_changed:
+            level, self.pending_brightness = self.pending_brightness, None
+        if level is not None:
+            self.apply_brightness(level)
+
+    def apply_brightness(self, level:int):
+        """writes brightness to device
+        Args:
+            level (int): numeric value from 0 up to 15
+        """
         # set min and max value if param out of brightness range
         if level < 0:
             level = 0
         elif level > 15:
             level = 15
-        self.device.contrast(level * 16) # set brightness
+        self.registers.write_intensity(level) # set brightness (skipped if unchanged)
+
+    def get_write_stats(self) -> dict[str:int]:
+        """returns SPI traffic counters of the display
+        Returns:
+            dict[str:int]: register writes done and skipped, bytes sent, skipped frames
+        """
+        stats = self.registers.get_stats()
+        stats["frames_skipped"] = self.frames_skipped
+        return stats
 
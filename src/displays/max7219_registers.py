@@ -0,0 +1,90 @@
+from luma.led_matrix import const
+
+class RegisterShadow:
+    def __init__(self, device):
+        """shadow copy of the registers of a MAX7219 chain, only changed registers are sent over SPI.
+        Registers are indexed in SPI buffer order (first chip in buffer is the last one in the chain), like luma's max7219.display.
+        Args:
+            device (luma.led_matrix.device.max7219): freshly initialized device (all digits cleared)
+        """
+        self.device = device
+        self.cascaded:int = device.cascaded
+        self.digits:list[bytearray] = [bytearray(8) for _ in range(self.cascaded)] # digit registers of each chip
+        self.intensity:int = None # intensity register, None if unknown
+
+        # counters to measure SPI bus traffic
+        self.writes_done:int = 0 # register writes sent
+        self.writes_skipped:int = 0 # register writes skipped because value didn't change
+        self.bytes_sent:int = 0 # bytes sent over SPI
+
+    def image_to_registers(self, image) -> list[bytearray]:
+        """converts preprocessed 1-bit image to digit registers (same mapping as luma's max7219.display)
+        Args:
+            image (PIL.Image): image in physical device orientation (after device.preprocess)
+
+        Returns:
+            list[bytearray]: 8 digit registers per chip in SPI buffer order
+        """
+        width, height = image.size
+        pix = image.convert("L").tobytes() # one byte per pixel
+        offsets = [(y * width) + x
+                   for y in range(height - 8, -8, -8)
+                   for x in range(width - 8, -8, -8)]
+        registers = []
+        for offset in offsets:
+            chip = bytearray(8)
+            for digit in range(8):
+                byte = 0
+                idx = offset + digit
+                for y in range(8):
+                    if pix[idx]:
+                        byte |= 1 << y
+                    idx += width
+                chip[digit] = byte
+            registers.append(chip)
+        return registers
+
+    def write_digits(self, registers:list[bytearray]):
+        """sends digit registers which differ from shadow, unchanged chips of a row get a no-op
+        Args:
+            registers (list[bytearray]): 8 digit registers per chip in SPI buffer order
+        """
+        for digit in range(8):
+            buf = []
+            changed = 0
+            for chip in range(self.cascaded):
+                value = registers[chip][digit]
+                if value != self.digits[chip][digit]:
+                    buf += [const.max7219.DIGIT_0 + digit, value]
+                    self.digits[chip][digit] = value
+                    changed += 1
+                else:
+                    buf += [const.max7219.NOOP, 0]
+            self.writes_skipped += self.cascaded - changed
+            if changed:
+                self.device.data(buf)
+                self.writes_done += changed
+                self.bytes_sent += len(buf)
+
+    def write_intensity(self, value:int):
+        """sets intensity register of all chips if changed
+        Args:
+            value (int): intensity 0 up to 15
+        """
+        if value == self.intensity:
+            self.writes_skipped += self.cascaded
+            return
+        buf = [const.max7219.INTENSITY, value] * self.cascaded
+        self.device.data(buf)
+        self.intensity = value
+        self.writes_done += self.cascaded
+        self.bytes_sent += len(buf)
+
+    def get_stats(self) -> dict[str:int]:
+        """returns SPI traffic counters
+        Returns:
+            dict[str:int]: register writes done and skipped, bytes sent
+        """
+        return {"writes_done": self.writes_done,
+                "writes_skipped": self.writes_skipped,
+                "bytes_sent": self.bytes_sent}
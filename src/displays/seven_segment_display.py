@@ -2,29 +2,58 @@ from luma.led_matrix.device import max7219
 from luma.core.interface.serial import spi, noop
 from luma.core.virtual import sevensegment
 
+from displays.max7219_registers import RegisterShadow
+from monitoring import metrics
+
 class SevenSegmentDisplay:
-    def __init__(self, n_cascading:int=1):
+    def __init__(self, n_cascading:int=1, serial_interface=None):
         """
         Args:
             n_cascading (int): number of cascaded seven segment displays - [>=1]
+            serial_interface (luma.core.interface.serial): interface to the chips, None for SPI CE1 (e.g. emulation.VirtualMax7219)
         """
         # create seven segment device
-        self.serial = spi(port=0, device=1, gpio=noop()) # device 1 = CE1
+        self.serial = serial_interface or spi(port=0, device=1, gpio=noop()) # device 1 = CE1
         self.device = max7219(self.serial, cascaded=n_cascading)
         self.segment = sevensegment(self.device)
-        self.segment.device.contrast(0) # darkest property
+        self.registers = RegisterShadow(self.device) # only changed digits are sent
+        self.current_text:str = "" # currently showed text
+        self.frames_skipped:int = 0 # updates skipped because text didn't change
+        self.registers.write_intensity(0) # darkest property
     
-    def update_display(self, value:float):
+    def update_display(self, value:float, stale:bool=False):
         """Changes value on seven segment display
         Args:
             value (float): value to update seven segment display
+            stale (bool): value is the last known one (e.g. inverter unreachable), marked by the dot of the last digit
         """
+        text = str(value)
+        if stale and isinstance(value, (int, float)):
+            text += "." # dot merges into last digit
         available_digits = self.segment.device.cascaded * 8
-        num_spaces = available_digits - len(str(value).replace(".", "")) # available digits - required digits (without dots)
-        right_aligned_text = " " * num_spaces + str(value)
-        if len(str(value).replace(".", "")) > available_digits: # displays only first few digits if text too long
+        num_spaces = available_digits - len(text.replace(".", "")) # available digits - required digits (without dots)
+        right_aligned_text = " " * num_spaces + text
+        if len(text.replace(".", "")) > available_digits: # displays only first few digits if text too long
             right_aligned_text = right_aligned_text[:available_digits]
-        self.segment.text = right_aligned_text # draws value
+        if right_aligned_text == self.current_text: # identical frame
+            self.frames_skipped += 1
+            return
+        self.current_text = right_aligned_text
+        with metrics.timer("seven_segment.frame"):
+            self.registers.write_digits(self.text_to_registers(right_aligned_text)) # draws value
+
+    def text_to_registers(self, text:str) -> list[bytearray]:
+        """converts text to digit registers (dots are merged into previous digit)
+        Args:
+            text (str): right aligned text
+
+        Returns:
+            list[bytearray]: 8 digit registers per chip in SPI buffer order
+        """
+        data = bytearray(self.device.segment_mapper(text, notfound=self.segment.undefined)).rjust(self.device.cascaded * 8, b"\0")
+        data.reverse() # last character is digit 0 of first chip in chain
+        # first chip in SPI buffer is the last one in the chain
+        return [data[chip * 8:chip * 8 + 8] for chip in reversed(range(self.device.cascaded))]
 
     def set_brightness(self, level:int):
         """Brightness property
@@ -36,5 +65,13 @@ class SevenSegmentDisplay:
             level = 0
         elif level > 15:
             level = 15
-        self.segment.device.contrast(level * 16) # set brightness
-        
+        self.registers.write_intensity(level) # set brightness (skipped if unchanged)
+
+    def get_write_stats(self) -> dict[str:int]:
+        """returns SPI traffic counters of the display
+        Returns:
+            dict[str:int]: register writes done and skipped, bytes sent, skipped frames
+        """
+        stats = self.registers.get_stats()
+        stats["frames_skipped"] = self.frames_skipped
+        return stats
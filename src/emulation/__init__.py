@@ -0,0 +1 @@
+# just to use emulation backends as module
\ No newline at end of file
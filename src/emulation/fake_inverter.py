@@ -0,0 +1,141 @@
+import os
+import json
+import random
+import asyncio
+
+from aiohttp import web
+
+from data_sources.sungrow_session import EventLoopThread, TOKEN_EXPIRED_CODE
+
+RECORDED_RESPONSES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recorded_responses.json")
+
+class FakeInverter:
+    FAILURE_MODES = ("disconnect", "timeout", "token_expired")
+
+    def __init__(self, host:str="127.0.0.1", port:int=8082, responses_file:str=RECORDED_RESPONSES,
+                 latency:float=0.05, jitter:float=0.0, failure_rate:float=0.0, failure_modes:tuple=FAILURE_MODES,
+                 seed:int=None, loop_thread:EventLoopThread=None):
+        """local stand-in for the WiNet-S websocket, replays recorded answers (SolarData connects with ip host and port port)
+        Args:
+            host (str): address to listen on
+            port (int): port to listen on (not 443, so SungrowSession uses ws instead of wss)
+            responses_file (str): JSON file with result_data of connect, login, devicelist, direct, a list of snapshots (real, real_battery)
+                                  and the i18n strings of the web interface
+            latency (float): seconds before every answer
+            jitter (float): additional random seconds before every answer - [0, jitter]
+            failure_rate (float): probability that a real time request fails - [0, 1]
+            failure_modes (tuple): failures to choose from - ["disconnect", "timeout", "token_expired"]
+            seed (int): seed of random failures and jitter (None for random)
+            loop_thread (EventLoopThread): thread running the server (None for own thread)
+        """
+        self.host = host
+        self.port = port
+        with open(responses_file, "r") as r_file:
+            self.responses:dict[str:any] = json.load(r_file)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_modes = failure_modes
+        self.random = random.Random(seed)
+        self.own_loop_thread = loop_thread is None
+        self.loop_thread = loop_thread or EventLoopThread("fake-inverter")
+        self.runner:web.AppRunner = None
+        self.offline:bool = False # closes every connection at its next request
+        self.snapshot_index:int = 0 # next replayed snapshot
+
+        self.connections:int = 0
+        self.requests:int = 0
+        self.failures:int = 0
+        self.logins:int = 0
+
+    def start(self):
+        """starts server (returns when it accepts connections)
+        """
+        async def start_server():
+            app = web.Application()
+            app.router.add_get("/ws/home/overview", self.handle_websocket)
+            app.router.add_get("/i18n/{locale}.properties", self.handle_i18n)
+            self.runner = web.AppRunner(app)
+            await self.runner.setup()
+            await web.TCPSite(self.runner, self.host, self.port).start()
+
+        self.loop_thread.run(start_server())
+
+    def stop(self):
+        """stops server (and its thread if own)
+        """
+        if self.runner is not None:
+            self.loop_thread.run(self.runner.cleanup())
+            self.runner = None
+        if self.own_loop_thread:
+            self.loop_thread.stop()
+
+    def set_offline(self, offline:bool):
+        """simulates unreachable inverter (open connections are closed at their next request)
+        Args:
+            offline (bool): refuse connections
+        """
+        self.offline = offline
+
+    def get_answer(self, service:str) -> dict[str:any]:
+        """returns recorded result_data of service, real time services replay the recorded snapshots in turn
+        Args:
+            service (str): WiNet-S service name
+
+        Returns:
+            dict[str:any]: result_data, None if service isn't recorded
+        """
+        if service in ("real", "real_battery"):
+            snapshots = self.responses["snapshots"]
+            answer = snapshots[self.snapshot_index % len(snapshots)].get(service)
+            if service == "real_battery": # snapshot is complete, next request gets next one
+                self.snapshot_index += 1
+            return answer
+        return self.responses.get(service)
+
+    async def handle_i18n(self, request:web.Request) -> web.Response:
+        """answers translations of the web interface (same strings for every locale)
+        """
+        if "i18n" not in self.responses:
+            raise web.HTTPNotFound()
+        return web.Response(text="\n".join(f"{key}={value}" for key, value in self.responses["i18n"].items()))
+
+    async def handle_websocket(self, request:web.Request) -> web.WebSocketResponse:
+        websocket = web.WebSocketResponse()
+        await websocket.prepare(request)
+        self.connections += 1
+        try:
+            async for message in websocket:
+                if self.offline:
+                    await websocket.close()
+                    break
+                request_data = json.loads(message.data)
+                service = request_data.get("service")
+                self.requests += 1
+                await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+                if websocket.closed: # client went away (e.g. timeout) while answer was delayed
+                    break
+
+                if service in ("real", "real_battery") and self.random.random() < self.failure_rate:
+                    self.failures += 1
+                    failure = self.random.choice(self.failure_modes)
+                    if failure == "disconnect":
+                        await websocket.close()
+                        break
+                    if failure == "token_expired":
+                        await websocket.send_json({"result_code": TOKEN_EXPIRED_CODE, "result_msg": "I18N_COMMON_TOKEN_INVALID"})
+                    continue # timeout: request is never answered
+
+                if service == "login":
+                    self.logins += 1
+                answer = self.get_answer(service)
+                if answer is None:
+                    await websocket.send_json({"result_code": 2, "result_msg": "unknown service"})
+                else:
+                    await websocket.send_json({"result_code": 1, "result_msg": "success", "result_data": answer})
+        except ConnectionResetError: # client closed between check and answer (aiohttp's ClientConnectionResetError)
+            pass
+        return websocket
+
+    def get_stats(self) -> dict[str:int]:
+        return {"connections": self.connections, "requests": self.requests, "failures": self.failures, "logins": self.logins}
@@ -0,0 +1,92 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+
+class FakeW1Tree:
+    def __init__(self, directory:str=None):
+        """fake 1-wire sysfs tree with DS18B20 device folders (pass directory as base_dir of TemperatureAndHumidity)
+        Args:
+            directory (str): folder of tree (None for new temporary folder, removed at close)
+        """
+        self.temporary = directory is None
+        self.directory = tempfile.mkdtemp(prefix="w1_") if directory is None else directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def get_path(self, sensor_id:str) -> str:
+        return os.path.join(self.directory, "28-" + sensor_id, "w1_slave")
+
+    def set_temperature(self, sensor_id:str, temperature:float, crc_ok:bool=True):
+        """writes w1_slave file of DS18B20 like the w1-therm driver
+        Args:
+            sensor_id (str): serial number of sensor (folder is 28-<sensor_id>)
+            temperature (float): temperature in °C
+            crc_ok (bool): if CRC check succeeded ("YES" in first line)
+        """
+        path = self.get_path(sensor_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        millidegrees = int(round(temperature * 1000))
+        raw = int(round(temperature * 16)) & 0xFFFF # sensor register in 1/16 °C (two's complement)
+        scratchpad = "%02x %02x 4b 46 7f ff 0c 10 " % (raw & 0xFF, raw >> 8)
+        crc = "%02x" % ((raw & 0xFF) or 1) # any non-zero value, reader only checks for zero
+        with open(path + ".tmp", "w") as d_file:
+            d_file.write(scratchpad + crc + " : crc=" + crc + (" YES\n" if crc_ok else " NO\n"))
+            d_file.write(scratchpad + "t=" + str(millidegrees) + "\n")
+        os.replace(path + ".tmp", path) # readers never see half written file
+
+    def disconnect(self, sensor_id:str):
+        """simulates unplugged sensor (driver returns zero values)
+        Args:
+            sensor_id (str): serial number of sensor
+        """
+        path = self.get_path(sensor_id)
+        if os.path.exists(path):
+            with open(path, "w") as d_file:
+                d_file.write("00 00 00 00 00 00 00 00 00 : crc=00 NO\n")
+                d_file.write("00 00 00 00 00 00 00 00 00 t=0\n")
+
+    def remove(self, sensor_id:str):
+        """removes device folder of sensor
+        Args:
+            sensor_id (str): serial number of sensor
+        """
+        shutil.rmtree(os.path.dirname(self.get_path(sensor_id)), ignore_errors=True)
+
+    def close(self):
+        """removes temporary tree
+        """
+        if self.temporary:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+class ScriptedDHT:
+    DHT11 = 11
+
+    def __init__(self, script:list[tuple]=None, read_time:float=0.5, repeat:bool=True):
+        """stand-in for the Adafruit_DHT module (pass as dht of TemperatureAndHumidity)
+        Args:
+            script (list[tuple]): (humidity, temperature) of consecutive readings, (None, None) for failed reading
+            read_time (float): seconds one reading blocks (real DHT11 takes about 2 seconds with retries)
+            repeat (bool): start script again after last reading, otherwise last reading is kept
+        """
+        self.script = script if script is not None else [(45.0, 21.0)]
+        self.read_time = read_time
+        self.repeat = repeat
+        self.position:int = 0
+        self.reads:int = 0
+        self.lock = threading.Lock()
+
+    def read_retry(self, sensor, pin, retries=15, delay_seconds=2) -> tuple:
+        """returns next scripted reading after read_time
+        Returns:
+            tuple: (humidity, temperature)
+        """
+        time.sleep(self.read_time)
+        with self.lock:
+            self.reads += 1
+            reading = self.script[self.position]
+            if self.position + 1 < len(self.script):
+                self.position += 1
+            elif self.repeat:
+                self.position = 0
+            return reading
@@ -0,0 +1,97 @@
+import time
+import threading
+import collections
+
+class VirtualMax7219:
+    NOOP = 0
+    DIGIT_0 = 1
+    INTENSITY = 10
+    SHUTDOWN = 12
+
+    def __init__(self, cascaded:int=1, max_writes:int=100000, burst_gap:float=0.005):
+        """stand-in for the SPI interface of a chain of MAX7219 chips, records register writes and frames.
+        Pass it as serial_interface of MatrixDisplay or SevenSegmentDisplay.
+        Args:
+            cascaded (int): number of chips in chain (same as n_cascading of display) - [>=1]
+            max_writes (int): number of recorded writes and frames, oldest are dropped
+            burst_gap (float): seconds without write which end a frame (all digit writes of one frame come at once)
+        """
+        self.cascaded = cascaded
+        self.burst_gap = burst_gap
+        self.lock = threading.Lock() # displays write from render and controller threads
+        self.digits = [bytearray(8) for _ in range(cascaded)] # current digit registers of each chip (chip 0 = first in chain)
+        self.intensity = [0] * cascaded
+        self.shutdown = [0] * cascaded
+        self.writes = collections.deque(maxlen=max_writes) # (monotonic time, register, chip, value), NOOPs are left out
+        self.frames = collections.deque(maxlen=max_writes) # (monotonic time of first write, digits of all chips)
+        self.bytes_sent:int = 0
+        self.transfers:int = 0
+        self.start_time:float = time.monotonic()
+        self.last_digit_write:float = None
+
+    def command(self, *cmd):
+        """luma serial interface: commands are sent like data
+        """
+        self.data(list(cmd))
+
+    def data(self, data):
+        """luma serial interface: one (register, value) pair per chip, first pair goes to the last chip in chain
+        Args:
+            data (list[int]): register and value pairs
+        """
+        now = time.monotonic()
+        with self.lock:
+            self.bytes_sent += len(data)
+            self.transfers += 1
+            digit_written = False
+            for pair in range(len(data) // 2):
+                chip = self.cascaded - 1 - pair % self.cascaded
+                register, value = data[2 * pair], data[2 * pair + 1]
+                if register == self.NOOP:
+                    continue
+                if self.DIGIT_0 <= register < self.DIGIT_0 + 8:
+                    self.digits[chip][register - self.DIGIT_0] = value
+                    digit_written = True
+                elif register == self.INTENSITY:
+                    self.intensity[chip] = value
+                elif register == self.SHUTDOWN:
+                    self.shutdown[chip] = value
+                self.writes.append((now, register, chip, value))
+            if digit_written:
+                digits = b"".join(self.digits)
+                if self.last_digit_write is None or now - self.last_digit_write > self.burst_gap:
+                    self.frames.append((now, digits)) # new frame
+                else:
+                    self.frames[-1] = (self.frames[-1][0], digits) # same frame, later digit
+                self.last_digit_write = now
+
+    def cleanup(self):
+        """luma serial interface: nothing to release
+        """
+        pass
+
+    def get_frame_times(self) -> list[float]:
+        """returns start times of recorded frames
+        Returns:
+            list[float]: monotonic times, oldest first
+        """
+        with self.lock:
+            return [frame[0] for frame in self.frames]
+
+    def get_bytes_per_minute(self) -> float:
+        """returns average SPI traffic since creation or reset
+        Returns:
+            float: bytes per minute
+        """
+        elapsed = time.monotonic() - self.start_time
+        return self.bytes_sent * 60 / elapsed if elapsed > 0 else 0.0
+
+    def reset_stats(self):
+        """clears recorded writes, frames and counters (registers keep their content)
+        """
+        with self.lock:
+            self.writes.clear()
+            self.frames.clear()
+            self.bytes_sent = 0
+            self.transfers = 0
+            self.start_time = time.monotonic()
@@ -1,64 +1,56 @@
+import os
+import signal
+import threading
+
 from display_controllers import display_controller
+from config import config_file
+from config.config_reloader import ConfigReloader
 
 def main():
-    # data sources names and units
-    data_sources_info:dict[str:dict[str:any]] = {"load_total_active_power" : {"name" : "Verbrauch",
-                                                                            "alias_and_unit" : "V W",
-                                                                            "is_inverter_item" : True,
-                                                                            "duration": 15},
-                                                "total_dcpower" : {"name" : "PV-in",
-                                                                        "alias_and_unit" : "P W",
-                                                                        "is_inverter_item" : True,
-                                                                        "duration" : 15},
-                                                "battery_soc" : {"name" : "Batterie",
-                                                                "alias_and_unit" : "B %",
-                                                                "is_inverter_item" : True,
-                                                                "duration": 5},
-                                                "temperature" : {"name" : "Temperatur",
-                                                                        "alias_and_unit" : "T C",
-                                                                        "is_inverter_item" : False,
-                                                                        "duration": 5},
-                                                "humidity" : {"name" : "Luftfeuchtigkeit",
-                                                                        "alias_and_unit" : "L %",
-                                                                        "is_inverter_item" : False,
-                                                                        "duration": 5}}
-                                                # Key: name of data source (same name as inverter-item if inverter_item!)
-                                                # Value: list of information concerning data source
-                                                # name: name to show on display ("" for default name)
-                                                # alias_and_unit: alias of data source with unit (showed after full name scrolled) - e.g. "B %" for Battery charge level in percent
-                                                # is_inverter_item: bool if source from inverter (sources from inverter dont need changes in another script)
-                                                # duration: how long source is displayed
-
-    # inverter information (type in your inverter ip address, username and passwort if changed from default)
-    inverter_ip = "192.168.178.47"
-    username = "user"
-    password = "pw1111"
-    port = 443
-    inverter_locale = "en_US" # language for data source keys
+    # all settings (data sources, inverter, displays, dimming, files) are in config.json, see README
+    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "config.json")
+    config = config_file.load_config(config_path)
 
-    # matrix adjustments
-    n_cascading_matrix:int = 2 # number of cascaded matrices (MAX7219) - [>=1]
-    block_orientation_matrix:int = 0 # Corrects block orientation when wired vertically - [0, 90, -90]
-    rotation_matrix:int = 2 # Rotate display - [0=0°, 1=90°, 2=180°, 3=270°]
-    inreverse_matrix:bool = False # Set to true if blocks are in reverse order - [True, False]
-
-    # seven segment adjustments
-    n_cascading_segment = 1 # number of cascaded seven segment displays - [>=1]
-    
-    display_controller_obj = display_controller.DisplayController(data_sources_info,
-                                                                  inverter_ip,
-                                                                  username,
-                                                                  password,
-                                                                  port,
-                                                                  inverter_locale=inverter_locale,
-                                                                  n_cascading_matrix=n_cascading_matrix,
-                                                                  block_orientation_matrix=block_orientation_matrix,
-                                                                  rotation_matrix=rotation_matrix,
-                                                                  inreverse_matrix=inreverse_matrix,
-                                                                  n_cascading_segment=n_cascading_segment) # init display controller object
+    display_controller_obj = display_controller.DisplayController(config["data_sources_info"],
+                                                                  config["inverter_ip"],
+                                                                  config["username"],
+                                                                  config["password"],
+                                                                  config["port"],
+                                                                  inverter_locale=config["inverter_locale"],
+                                                                  inverter_cache_ttl=config["inverter_cache_ttl"],
+                                                                  n_cascading_matrix=config["n_cascading_matrix"],
+                                                                  block_orientation_matrix=config["block_orientation_matrix"],
+                                                                  rotation_matrix=config["rotation_matrix"],
+                                                                  inreverse_matrix=config["inreverse_matrix"],
+                                                                  n_cascading_segment=config["n_cascading_segment"],
+                                                                  background_sampling=config["background_sampling"],
+                                                                  adaptive_polling=config["adaptive_polling"],
+                                                                  history_dir=config["history_dir"],
+                                                                  stats_file=config["stats_file"],
+                                                                  stats_interval=config["stats_interval"],
+                                                                  api_host=config["api_host"],
+                                                                  api_port=config["api_port"],
+                                                                  inverters=config_file.get_inverter_endpoints(config),
+                                                                  dim_start=config["dim_start"],
+                                                                  dim_end=config["dim_end"],
+                                                                  backends=[]) # init display controller object, own sensors (DataSourceBackend) in backends
 
+    display_controller_obj.start_sampling_threads() # starts background readings of all data sources
     display_controller_obj.start_auto_update_thread() # starts auto changing data sources thread
     display_controller_obj.start_update_thread() # starts thread for update values every second
+    display_controller_obj.start_stats_thread() # starts writing stats file every stats_interval
+    display_controller_obj.start_api_server() # starts local HTTP API
+    config_reloader = ConfigReloader(config_path, display_controller_obj, config)
+    config_reloader.start() # applies changes of config.json while running
+
+    # all threads are daemon threads, so main thread keeps the program running until kill -2 (SIGINT) or SIGTERM
+    stop_event = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    while not stop_event.wait(1): # wakes up regularly, so signals are handled without delay
+        pass
+    config_reloader.stop()
+    display_controller_obj.stop() # writes final stats and history
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1 @@
+# just to use monitoring as module
\ No newline at end of file
@@ -0,0 +1,252 @@
+import os
+import json
+import time
+import bisect
+import threading
+import collections
+
+class Histogram:
+    BOUNDS = [1e-5 * 1.5 ** i for i in range(40)] # upper bounds of buckets in seconds (10 µs to about 70 s)
+
+    def __init__(self):
+        """fixed log-spaced buckets, recording is O(log buckets) and needs no memory per sample
+        """
+        self.buckets = [0] * (len(self.BOUNDS) + 1) # last bucket for values above all bounds
+        self.count:int = 0
+        self.total:float = 0.0
+        self.max_value:float = None
+
+    def observe(self, value:float):
+        self.buckets[bisect.bisect_left(self.BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.max_value is None or value > self.max_value:
+            self.max_value = value
+
+    def get_percentile(self, percent:float) -> float:
+        """returns upper bound of bucket containing the percentile (at most the maximum value)
+        Args:
+            percent (float): percentile - [0, 100]
+
+        Returns:
+            float: seconds, None if empty
+        """
+        if self.count == 0:
+            return None
+        rank = self.count * percent / 100
+        cumulative = 0
+        for i, bucket in enumerate(self.buckets):
+            cumulative += bucket
+            if cumulative >= rank and bucket:
+                return min(self.BOUNDS[i], self.max_value) if i < len(self.BOUNDS) else self.max_value
+        return self.max_value
+
+    def get_stats(self) -> dict[str:float]:
+        """returns summary in milliseconds
+        Returns:
+            dict[str:float]: count, avg_ms, p50_ms, p95_ms, p99_ms and max_ms
+        """
+        def to_ms(seconds):
+            return None if seconds is None else round(seconds * 1000, 3)
+
+        return {"count": self.count,
+                "avg_ms": to_ms(self.total / self.count if self.count else None),
+                "p50_ms": to_ms(self.get_percentile(50)),
+                "p95_ms": to_ms(self.get_percentile(95)),
+                "p99_ms": to_ms(self.get_percentile(99)),
+                "max_ms": to_ms(self.max_value)}
+
+class Metrics:
+    def __init__(self):
+        """named latency histograms and counters of the whole program
+        """
+        self.lock = threading.Lock() # recording is a few additions, so one lock for all metrics is enough
+        self.histograms:dict[str:Histogram] = {}
+        self.counters = collections.Counter()
+        self.start_time:float = time.monotonic()
+
+    def observe(self, name:str, seconds:float):
+        """records a duration
+        Args:
+            name (str): name of histogram (e.g. "fetch.climate")
+            seconds (float): measured duration
+        """
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, name:str, amount:int=1):
+        """counts an event
+        Args:
+            name (str): name of counter (e.g. "errors.inverter.TimeoutError")
+            amount (int): added value
+        """
+        with self.lock:
+            self.counters[name] += amount
+
+    def timer(self, name:str):
+        """returns context manager which records the duration of its block
+        Args:
+            name (str): name of histogram
+        """
+        return Timer(self, name)
+
+    def get_stats(self) -> dict[str:any]:
+        """returns summary of all metrics
+        Returns:
+            dict[str:any]: "uptime_s", "histograms" (name -> summary in ms) and "counters"
+        """
+        with self.lock:
+            return {"uptime_s": round(time.monotonic() - self.start_time, 1),
+                    "histograms": {name: histogram.get_stats() for name, histogram in sorted(self.histograms.items())},
+                    "counters": dict(sorted(self.counters.items()))}
+
+    def reset(self):
+        """clears all metrics (e.g. after startup before measuring steady state)
+        """
+        with self.lock:
+            self.histograms = {}
+            self.counters = collections.Counter()
+            self.start_time = time.monotonic()
+
+class Timer:
+    def __init__(self, metrics:Metrics, name:str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        if exc_type is not None:
+            self.metrics.increment("errors." + self.name + "." + exc_type.__name__)
+
+class InstrumentedLock:
+    def __init__(self, name:str, metrics:"Metrics"=None):
+        """lock which records how long it is waited for and held ("lock.<name>.wait" and "lock.<name>.hold")
+        Args:
+            name (str): name of lock in metrics
+            metrics (Metrics): metrics to record in (None for the program-wide metrics)
+        """
+        self.lock = threading.Lock()
+        self.metrics = metrics or program_metrics
+        self.wait_name = "lock." + name + ".wait"
+        self.hold_name = "lock." + name + ".hold"
+        self.acquired:float = None # time of acquire of current holder
+
+    def acquire(self, blocking:bool=True, timeout:float=-1) -> bool:
+        start = time.perf_counter()
+        if not self.lock.acquire(blocking, timeout):
+            self.metrics.increment(self.wait_name + ".failed") # non-blocking acquire of busy lock
+            return False
+        self.acquired = time.perf_counter()
+        self.metrics.observe(self.wait_name, self.acquired - start)
+        return True
+
+    def release(self):
+        held = time.perf_counter() - self.acquired
+        self.lock.release()
+        self.metrics.observe(self.hold_name, held)
+
+    def locked(self) -> bool:
+        return self.lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+class StatsDumper:
+    def __init__(self, path:str, interval:float=60, providers:dict=None, metrics:Metrics=None):
+        """writes all metrics and statistics periodically as JSON file (replaced atomically, readers never see half a file)
+        Args:
+            path (str): stats file
+            interval (float): seconds between two dumps
+            providers (dict[str:function]): section name -> function without parameters returning statistics (e.g. SolarData.get_stats)
+            metrics (Metrics): metrics to dump (None for the program-wide metrics)
+        """
+        self.path = path
+        self.interval = interval
+        self.providers = providers or {}
+        self.metrics = metrics or program_metrics
+        self.stop_event = threading.Event()
+        self.thread:threading.Thread = None
+
+    def get_stats(self) -> dict[str:any]:
+        """returns metrics and statistics of all providers
+        Returns:
+            dict[str:any]: "time", "metrics" and one section per provider
+        """
+        return collect_stats(self.providers, self.metrics)
+
+    def dump(self):
+        """writes stats file once
+        """
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w") as s_file:
+            json.dump(self.get_stats(), s_file, indent=1, default=str)
+        os.replace(temporary_path, self.path)
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.dump()
+            except OSError as e:
+                print("OSError:", e)
+
+    def start(self):
+        """starts dumping thread (does nothing if already started)
+        """
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.run, name="stats-dumper", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """stops dumping thread and writes final stats
+        """
+        self.stop_event.set()
+        if self.thread: # if thread is not None
+            self.thread.join()
+            self.dump()
+
+program_metrics = Metrics() # program-wide metrics, used by all modules
+
+def collect_stats(providers:dict=None, metrics:Metrics=None) -> dict[str:any]:
+    """returns metrics and statistics of all providers (a failing provider only breaks its own section)
+    Args:
+        providers (dict[str:function]): section name -> function without parameters returning statistics
+        metrics (Metrics): metrics to include (None for the program-wide metrics)
+
+    Returns:
+        dict[str:any]: "time", "metrics" and one section per provider
+    """
+    stats = {"time": time.time(), "metrics": (metrics or program_metrics).get_stats()}
+    for section, provider in (providers or {}).items():
+        try:
+            stats[section] = provider()
+        except Exception as e:
+            stats[section] = {"error": type(e).__name__ + ": " + str(e)}
+    return stats
+
+def observe(name:str, seconds:float):
+    """records a duration in the program-wide metrics (see Metrics.observe)
+    """
+    program_metrics.observe(name, seconds)
+
+def increment(name:str, amount:int=1):
+    """counts an event in the program-wide metrics (see Metrics.increment)
+    """
+    program_metrics.increment(name, amount)
+
+def timer(name:str) -> Timer:
+    """returns context manager recording the duration of its block in the program-wide metrics
+    """
+    return program_metrics.timer(name)